@@ -1,98 +1,66 @@
 import pandas as pd
 import streamlit as st
 #from PIL import Image
-import inflection
-from currency_converter import CurrencyConverter
-import folium
-from folium.plugins import MarkerCluster
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
+
+from utils.backend import load_backend
+from utils.maps import base_map, map_layer, map_state_key, map_view
+from utils.tracing import start_trace, span, traced_fragment, finish_trace
 
 # ====================================================================================
 # Defining functions
 # ====================================================================================
-# Faz cópia do dataframe original e altera os nomes das colunas, tirando o espaço e colocando underline
-def rename_columns(dataframe):
-    df = dataframe.copy()
-    title = lambda x: inflection.titleize(x)
-    snakecase = lambda x: inflection.underscore(x)
-    spaces = lambda x: x.replace(" ", "")
-    cols_old = list(df.columns)
-    cols_old = list(map(title, cols_old))
-    cols_old = list(map(spaces, cols_old))
-    cols_new = list(map(snakecase, cols_old))
-    df.columns = cols_new
-    return df
-
-def currency_code(currency):
-    """
-    Retorna o código da moeda baseado na informação da coluna currency
-    """
-    CURRENCY = {
-            "Indian Rupees(Rs.)": "INR",
-            "Dollar($)": "AUD",
-            "Brazilian Real(R$)": "BRL",
-            "Dollar($)": "CAD",
-            "Indonesian Rupiah(IDR)": "IDR",
-            "NewZealand($)": "NZD",
-            "Botswana Pula(P)": "PHP",
-            "Qatari Rial(QR)": "QAR",
-            "Dollar($)": "SGD",
-            "Rand(R)": "ZAR",
-            "Sri Lankan Rupee(LKR)": "LKR",
-            "Turkish Lira(TL)": "TRY",
-            "Emirati Diram(AED)": "AED",
-            "Pounds(£)": "GBP",
-            "Dollar($)": "USD"
-        }
-    return CURRENCY[currency]
-
-def country_name(country_ID):
-    """Função que recebe o ID do país e retorna seu nome"""
-    # Cria dicionário código do país -> nome do país
-    COUNTRY = {
-        1: "India",
-        14: "Australia",
-        30: "Brazil",
-        37: "Canada",
-        94: "Indonesia",
-        148: "New Zeland",
-        162: "Philippines",
-        166: "Qatar",
-        184: "Singapure",
-        189: "South Africa",
-        191: "Sri Lanka",
-        208: "Turkey",
-        214: "United Arab Emirates",
-        215: "England",
-        216: "United States of America"
-    }
-    return COUNTRY[country_ID]
-
-
+# Só o mapa depende do seletor de países e da área visível: ao mudar a seleção, o zoom
+# ou a posição do mapa, somente o fragmento é reexecutado, e os números gerais não são
+# recalculados
+@traced_fragment('Home', 'fragment.mapa')
+def world_map(backend, countries, map_grid):
+    with span('aggregate.top_4'):
+        top_4 = countries.sort_values(by='restaurants', ascending=False).reset_index(drop=True)
+        top_4 = list(top_4.loc[0:3, 'country_name'])
+    # Seletor de países para ver os restaurantes
+    country_selector = st.multiselect(
+        'Selecione o(s) país(es) para ver os restaurantes.',
+        countries.sort_values(by='order')['country_name'],
+        default=top_4
+    )
+    # Filtro para países (bitmaps no backend pandas; no arrow, aplicado na leitura do snapshot)
+    with span('aggregate.filtro'):
+        df1_filtered = backend.restaurants(['restaurant_name', 'latitude', 'longitude'], country_selector)
+    # Longe, vão para o navegador as células da grade na área visível; perto, os restaurantes.
+    # Um zoom ou deslocamento do mapa reexecuta o fragmento com o novo estado já na
+    # sessão: a camada é montada para a nova visão nessa mesma execução
+    state_key = map_state_key('mapa')
+    if state_key is not None:
+        view = map_view(st.session_state.get(state_key))
+    else:
+        view = st.session_state.get('map_view', map_view())
+    with span('render.mapa'):
+        layer = map_layer(view, map_grid, df1_filtered, country_selector)
+    with span('render.st_folium'):
+        state = st_folium(base_map(), key='mapa', feature_group_to_add=layer,
+                          returned_objects=['zoom', 'bounds'], width=1150, height=500)
+    # Sem a chave do estado (outra versão do streamlit_folium), a visão nova só é
+    # conhecida pelo retorno do st_folium: a camada é refeita em outra execução
+    if state_key is None and map_view(state) != view:
+        st.session_state['map_view'] = map_view(state)
+        st.rerun(scope='fragment')
 # ====================================================================================
 
 # ====================================================================================
 # Data loading and cleaning
 # ====================================================================================
-df = pd.read_csv('dataset/zomato.csv')
-df1 = rename_columns(df)
-df1 = df1.dropna()
-# Categoriza os restaurantes somente por um tipo de cuisines
-df1['cuisines'] = df1.loc[:, 'cuisines'].apply(lambda x: x.split(',')[0])
-
-# Insere colunas com o código da moeda e com o custo do prato para dois em USD
-c = CurrencyConverter('./dataset/currencies.csv')
-df1['currency_code'] = df1['currency'].apply(currency_code)
-df1['average_cost_for_two_us_dollar'] = df1[['average_cost_for_two', 'currency_code']].apply(lambda x: 
-                                                                                             c.convert(x['average_cost_for_two'], x['currency_code'], 'USD'), axis=1)
-
-# Remove a linha com valor average_cost_for_two = 2500000
-cols = ['restaurant_name', 'average_cost_for_two_us_dollar']
-lines = df1['restaurant_name'] == "d'Arry's Verandah Restaurant"
-df1.drop(df1.index[385], inplace=True)
-
-# Cria coluna com o nome dos países
-df1['country_name'] = df1['country_code'].apply(country_name)
+# Tudo vem do backend de consultas (ZOMATO_BACKEND): no pandas, as métricas
+# pré-calculadas (python -m utils.metrics) e o df1 limpo, carregado uma única vez por
+# processo e compartilhado entre as páginas; no arrow, o pyarrow no snapshot, sem o df1.
+# Tempos de cada seção (painel na barra lateral com ?debug=1 ou ZOMATO_TRACE=1)
+start_trace('Home')
+with span('load'):
+    backend = load_backend()
+    overview = backend.overview()
+    countries = backend.countries()
+    # Grade com a quantidade de restaurantes e a nota média por região, em cada zoom
+    map_grid = backend.map_grid()
 # ====================================================================================
 
 # ====================================================================================
@@ -112,18 +80,6 @@ st.set_page_config(
 #st.sidebar.image(image, width=120)
 st.sidebar.markdown('<h2 style="text-align: center"> Fome Zero Company </h2>', unsafe_allow_html=True)
 st.sidebar.markdown("""___""")
-
-top_4 = df1.loc[:,['restaurant_id', 'country_name']].groupby(['country_name']).count().sort_values(by='restaurant_id', ascending=False).reset_index()
-top_4 = list(top_4.loc[0:3, 'country_name'])
-# Seletor de países para ver as métricas
-country_selector = st.sidebar.multiselect(
-    'Selecione o(s) país(es) para ver os restaurantes.',
-    df1["country_name"].unique(),
-    default=top_4
-)
-# Filtro para países
-lines = df1['country_name'].isin(country_selector)
-df1_filtered = df1.loc[lines, :]
 # ====================================================================================
 
 # ====================================================================================
@@ -132,36 +88,29 @@ df1_filtered = df1.loc[lines, :]
 st.markdown('<h1 style="text-align: center"> Fome Zero Dashboard </h1>', unsafe_allow_html=True)
 st.markdown("""___""")
 
-with st.container():
+with st.container(), span('render.numeros'):
     st.markdown('<h2> Números gerais da empresa </h2>', unsafe_allow_html=True)
     col1, col2, col3, col4, col5 = st.columns(5, gap='medium')
     with col1:
-        unique_restaurant = df1['restaurant_id'].nunique()
+        unique_restaurant = overview.loc[0, 'restaurants']
         col1.metric('Restaurantes cadastrados', unique_restaurant)
     with col2:
-        unique_countries = df1['country_code'].nunique()
+        unique_countries = overview.loc[0, 'countries']
         col2.metric('Países cadastrados', unique_countries)
     with col3:
-        unique_cities = df1['city'].nunique()
+        unique_cities = overview.loc[0, 'cities']
         col3.metric('Cidades cadastradas', unique_cities)
     with col4:
-        sum_votes = df1['votes'].sum()
+        sum_votes = overview.loc[0, 'votes']
         col4.metric('Total de avaliações recebidas', sum_votes)
     with col5:
-        unique_cuisines = df1['cuisines'].nunique()
+        unique_cuisines = overview.loc[0, 'cuisines']
         col5.metric('Tipo de culinária oferecida', unique_cuisines)
 st.markdown("""___""")
 with st.container():
     st.markdown('<h2> Restaurantes pelo mundo </h2>', unsafe_allow_html=True)
-    cols = ['restaurant_name', 'country_name', 'latitude', 'longitude', 'aggregate_rating']
-    df_aux = df1_filtered.loc[:, cols]
-    map = folium.Map(location = [27.919478, -16.905911], zoom_start=2)
-    cluster = MarkerCluster().add_to(map)
-    for index, location_info in df_aux.iterrows():
-        #iframe = folium.IFrame(location_info['restaurant_name'] + '<br>' + location_info['country_name'])
-        folium.Marker([location_info['latitude'], location_info['longitude']],
-                    popup=location_info['restaurant_name']).add_to(cluster)
-    folium_static(map, width=1150)
+    world_map(backend, countries, map_grid)
 
+finish_trace()
 # ====================================================================================
 
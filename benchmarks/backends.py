@@ -0,0 +1,92 @@
+"""
+Confere e mede os backends de consulta das métricas (utils.backend).
+
+Para cada tabela (números gerais, países, cidades e culinárias) e cada seleção de
+países, compara o resultado do backend arrow com o do pandas: mesmas linhas, na
+mesma ordem, e valores iguais até a tolerância do float (as somas são feitas em
+outra ordem). Mede também o tempo de cada consulta, com o cache do backend arrow
+desligado. Termina com erro se algum resultado for diferente.
+
+Uso:
+    python -m benchmarks.backends
+    ZOMATO_DATASET_DIR=pasta_do_dataset python -m benchmarks.backends --repeat 5
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.pages import ALL_COUNTRIES
+from utils.backend import ArrowBackend, PandasBackend
+from utils.data import ensure_snapshot
+from utils.metrics import load_metrics, precompute
+
+# Tolerância relativa das medidas em float
+RTOL = 1e-9
+
+def selections(seed=0, n_random=10):
+    """Seleções de países: nenhuma, todas, vazia, cada país e algumas aleatórias"""
+    rng = random.Random(seed)
+    result = [None, ALL_COUNTRIES, [], ['Nowhere']] + [[country] for country in ALL_COUNTRIES]
+    result += [rng.sample(ALL_COUNTRIES, rng.randint(2, len(ALL_COUNTRIES) - 1)) for _ in range(n_random)]
+    return result
+
+def normalized(df):
+    """Categorias viram texto: o pandas guarda todas as categorias do dataset, mesmo as não usadas"""
+    df = df.reset_index(drop=True)
+    return df.astype({col: str for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+
+def compare(expected, result):
+    """Mensagem com a diferença entre as tabelas, ou None se forem iguais"""
+    try:
+        pd.testing.assert_frame_equal(normalized(expected), normalized(result), check_dtype=False, rtol=RTOL)
+    except AssertionError as error:
+        return str(error)
+    return None
+
+def timed(func, repeat):
+    """Resultado de func() e a mediana do tempo em ms"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=3, help='execuções de cada consulta')
+    args = parser.parse_args()
+
+    files = ensure_snapshot()
+    precompute()
+    pandas_backend = PandasBackend(load_metrics())
+    # Sem cache, para medir a leitura e o agrupamento de cada consulta
+    arrow_backend = ArrowBackend(files, cache_size=0)
+
+    queries = [('overview', None), ('cuisines', None)]
+    queries += [(name, selection) for name in ['countries', 'cities'] for selection in selections()]
+    failures = 0
+    totals = {'pandas': 0.0, 'arrow': 0.0}
+    for name, selection in queries:
+        query_args = () if name in ('overview', 'cuisines') else (selection,)
+        expected, pandas_ms = timed(lambda: getattr(pandas_backend, name)(*query_args), args.repeat)
+        result, arrow_ms = timed(lambda: getattr(arrow_backend, name)(*query_args), args.repeat)
+        totals['pandas'] += pandas_ms
+        totals['arrow'] += arrow_ms
+        error = compare(expected, result)
+        label = 'todos' if selection is None else ','.join(selection) or 'vazio'
+        print(f"{name:<10} {label[:40]:<40} pandas={pandas_ms:8.2f} ms arrow={arrow_ms:8.2f} ms "
+              f"{'OK' if error is None else 'DIFERENTE'}")
+        if error is not None:
+            failures += 1
+            print(error)
+    print(f"{len(queries)} consultas, {failures} diferentes; total pandas={totals['pandas']:.1f} ms "
+          f"arrow={totals['arrow']:.1f} ms")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Benchmark da conversão para USD: apply linha a linha com o CurrencyConverter
+versus o VectorConverter. Com --rates (um arquivo de cotações com várias datas),
+cada linha recebe uma data e a conversão usa a cotação mais recente até ela.
+
+Uso: python -m benchmarks.currency [--sizes 10000 1000000 10000000] [--apply-max 1000000]
+                                   [--rates eurofxref-hist.csv]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from currency_converter import CurrencyConverter
+
+from utils.currency import VectorConverter, read_rates
+from utils.data import CURRENCY, COUNTRY, CURRENCIES_PATH, currency_code, country_name, map_column
+
+def make_frame(n_rows, seed=42, currencies=None, dates=None):
+    """Gera um dataframe com as colunas usadas na conversão (e uma data por linha, entre dates)"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'average_cost_for_two': rng.integers(1, 5000, n_rows),
+        'currency': rng.choice(currencies or list(CURRENCY.keys()), n_rows),
+        'country_code': rng.choice(list(COUNTRY.keys()), n_rows),
+    })
+    if dates is not None:
+        days = (dates[-1] - dates[0]).days
+        df['date'] = dates[0] + pd.to_timedelta(rng.integers(0, days + 1, n_rows), unit='D')
+    return df
+
+def timeit(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def run(sizes, apply_max, rates_path=None):
+    if rates_path is None:
+        c = CurrencyConverter(CURRENCIES_PATH)
+        vc = VectorConverter(CURRENCIES_PATH)
+        currencies, dates = None, None
+    else:
+        # Cotação mais recente até a data de cada linha, como o fallback 'last_known'
+        c = CurrencyConverter(rates_path, fallback_on_missing_rate=True,
+                              fallback_on_missing_rate_method='last_known', fallback_on_wrong_date=True)
+        vc = VectorConverter(rates_path)
+        # Só as moedas do dataset que existem no arquivo de cotações
+        currencies = [label for label, code in CURRENCY.items() if code in vc.currencies]
+        dates = read_rates(rates_path).index
+    print(f"{'linhas':>10} | {'apply (s)':>10} | {'vetorizado (s)':>14} | {'speedup':>8}")
+    for n_rows in sizes:
+        df = make_frame(n_rows, currencies=currencies, dates=dates)
+        def vectorized():
+            codes = map_column(df['currency'], CURRENCY)
+            usd = vc.convert(df['average_cost_for_two'], codes, 'USD', df.get('date'))
+            names = map_column(df['country_code'], COUNTRY)
+            return codes, usd, names
+        vector_time, (codes, usd, names) = timeit(vectorized)
+        if n_rows <= apply_max:
+            def row_wise():
+                aux = df.copy()
+                aux['currency_code'] = aux['currency'].apply(currency_code)
+                if dates is None:
+                    aux['usd'] = aux[['average_cost_for_two', 'currency_code']].apply(lambda x:
+                        c.convert(x['average_cost_for_two'], x['currency_code'], 'USD'), axis=1)
+                else:
+                    aux['usd'] = aux[['average_cost_for_two', 'currency_code', 'date']].apply(lambda x:
+                        c.convert(x['average_cost_for_two'], x['currency_code'], 'USD', x['date'].date()), axis=1)
+                aux['country_name'] = aux['country_code'].apply(country_name)
+                return aux
+            apply_time, aux = timeit(row_wise)
+            # Os resultados precisam ser idênticos aos do CurrencyConverter
+            assert (aux['currency_code'].to_numpy() == codes.to_numpy()).all()
+            assert np.array_equal(aux['usd'].to_numpy(), usd)
+            assert (aux['country_name'].to_numpy() == names.to_numpy()).all()
+            print(f"{n_rows:>10} | {apply_time:>10.3f} | {vector_time:>14.4f} | {apply_time / vector_time:>7.0f}x")
+        else:
+            print(f"{n_rows:>10} | {'-':>10} | {vector_time:>14.4f} | {'-':>8}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--apply-max', type=int, default=1_000_000,
+                        help='maior número de linhas em que o apply linha a linha também é medido')
+    parser.add_argument('--rates', help='arquivo de cotações com várias datas (conversão pela data de cada linha)')
+    args = parser.parse_args()
+    run(args.sizes, args.apply_max, args.rates)
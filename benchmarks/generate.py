@@ -0,0 +1,168 @@
+"""
+Gerador de datasets sintéticos no formato do dataset/zomato.csv, para testar o
+dashboard com volumes de produção (de 100 mil a dezenas de milhões de linhas).
+
+O modelo é aprendido do zomato.csv original:
+- país, cidade e moeda são sorteados juntos, com as frequências de cada cidade;
+- coordenadas e bairro vêm de um restaurante da mesma cidade, com um pequeno
+  deslocamento aleatório (os agrupamentos de cada cidade são mantidos);
+- nome e lista de culinárias vêm de um restaurante do mesmo país;
+- custo, faixa de preço e serviços vêm de um restaurante do mesmo país, com o
+  custo variado em torno do original;
+- nota, cor, texto da nota e votos vêm de um restaurante do mesmo país (assim o
+  texto continua no idioma do país e "Not rated" continua com nota 0).
+Restaurantes repetidos aparecem na mesma proporção do arquivo original.
+
+O arquivo é gerado em blocos, sem manter o dataset inteiro na memória, e o
+resultado depende só da semente e do tamanho do bloco.
+
+Uso: python -m benchmarks.generate 1000000 --output /tmp/zomato_1m [--seed 42]
+"""
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.paths import ZOMATO_PATH, CURRENCIES_PATH
+
+# Linhas geradas (e gravadas) por vez
+CHUNK_SIZE = 500_000
+
+# Desvio padrão do deslocamento das coordenadas, em graus (~500 m)
+COORD_JITTER = 0.005
+
+# Desvio padrão (em escala logarítmica) da variação do custo e dos votos
+COST_JITTER = 0.15
+VOTES_JITTER = 0.2
+
+# Restaurantes que a limpeza descarta não servem de modelo
+EXCLUDED_NAMES = ["d'Arry's Verandah Restaurant"]
+
+def significant(values, digits=2):
+    """Arredonda para digits algarismos significativos, como os custos do dataset (450, 1100, 250000)"""
+    values = np.asarray(values, dtype='float64')
+    scale = 10.0 ** (np.floor(np.log10(np.where(values > 0, values, 1.0))) - (digits - 1))
+    return np.round(values / np.maximum(scale, 1.0)) * np.maximum(scale, 1.0)
+
+class Groups:
+    """Posições das linhas de cada grupo, para sortear um "doador" dentro do grupo"""
+    def __init__(self, codes):
+        self.order = np.argsort(codes, kind='stable')
+        self.bounds = np.searchsorted(codes[self.order], np.arange(codes.max() + 2))
+
+    def sample(self, rng, groups):
+        """Sorteia uma linha de cada grupo em groups"""
+        starts = self.bounds[groups]
+        sizes = self.bounds[groups + 1] - starts
+        return self.order[starts + (rng.random(len(groups)) * sizes).astype(np.int64)]
+
+class ZomatoModel:
+    """Distribuições aprendidas do zomato.csv, usadas para gerar novas linhas"""
+    def __init__(self, source=ZOMATO_PATH):
+        df = pd.read_csv(source)
+        df = df[~df['Restaurant Name'].isin(EXCLUDED_NAMES)].reset_index(drop=True)
+        self.columns = list(df.columns)
+        self.df = df
+        self.duplicate_rate = 1 - df['Restaurant ID'].nunique() / len(df)
+        self.next_id = int(df['Restaurant ID'].max()) + 1
+
+        cities, self.cities = pd.factorize(df['City'])
+        countries, _ = pd.factorize(df['Country Code'])
+        self.city_weights = np.bincount(cities) / len(df)
+        self.city_cumulative = np.cumsum(self.city_weights)
+        # País de cada cidade (uma cidade pertence a um único país)
+        self.city_country = np.zeros(len(self.cities), dtype=np.int64)
+        self.city_country[cities] = countries
+        self.by_city = Groups(cities)
+        self.by_country = Groups(countries)
+
+    def sample(self, n_rows, rng, first_id):
+        """Gera n_rows linhas, com restaurant_id a partir de first_id"""
+        df = self.df
+        city = np.minimum(np.searchsorted(self.city_cumulative, rng.random(n_rows), side='right'),
+                          len(self.cities) - 1)
+        country = self.city_country[city]
+        geo = self.by_city.sample(rng, city)
+        name = self.by_country.sample(rng, country)
+        cost = self.by_country.sample(rng, country)
+        rating = self.by_country.sample(rng, country)
+
+        def take(col, rows):
+            return df[col].to_numpy()[rows]
+
+        latitude = take('Latitude', geo)
+        longitude = take('Longitude', geo)
+        moved = (latitude != 0) | (longitude != 0)
+        latitude = np.where(moved, latitude + rng.normal(0, COORD_JITTER, n_rows), latitude)
+        longitude = np.where(moved, longitude + rng.normal(0, COORD_JITTER, n_rows), longitude)
+        city_names = take('City', geo)
+        locality = take('Locality', geo)
+        votes = take('Votes', rating)
+        votes = np.where(votes > 0, np.maximum(np.round(votes * np.exp(rng.normal(0, VOTES_JITTER, n_rows))), 1), 0)
+
+        out = pd.DataFrame({
+            'Restaurant ID': np.arange(first_id, first_id + n_rows),
+            'Restaurant Name': take('Restaurant Name', name),
+            'Country Code': take('Country Code', geo),
+            'City': city_names,
+            'Address': [f'{number} {place}, {city_name}' for number, place, city_name
+                        in zip(rng.integers(1, 1000, n_rows), locality, city_names)],
+            'Locality': locality,
+            'Locality Verbose': take('Locality Verbose', geo),
+            'Longitude': longitude.round(10),
+            'Latitude': latitude.round(10),
+            'Cuisines': take('Cuisines', name),
+            'Average Cost for two': significant(take('Average Cost for two', cost)
+                                                * np.exp(rng.normal(0, COST_JITTER, n_rows))).astype('int64'),
+            'Currency': take('Currency', geo),
+            'Has Table booking': take('Has Table booking', cost),
+            'Has Online delivery': take('Has Online delivery', cost),
+            'Is delivering now': take('Is delivering now', cost),
+            'Switch to order menu': take('Switch to order menu', cost),
+            'Price range': take('Price range', cost),
+            'Aggregate rating': take('Aggregate rating', rating),
+            'Rating color': take('Rating color', rating),
+            'Rating text': take('Rating text', rating),
+            'Votes': votes.astype('int64'),
+        }, columns=self.columns)
+
+        # Restaurantes repetidos: copia linhas anteriores do mesmo bloco
+        duplicates = np.flatnonzero(rng.random(n_rows) < self.duplicate_rate)
+        duplicates = duplicates[duplicates > 0]
+        rows = np.arange(n_rows)
+        rows[duplicates] = (rng.random(len(duplicates)) * duplicates).astype(np.int64)
+        return out.take(rows).reset_index(drop=True)
+
+def generate(n_rows, path, seed=42, chunk_size=CHUNK_SIZE, source=ZOMATO_PATH):
+    """Grava em path um csv sintético com n_rows linhas, em blocos de chunk_size"""
+    model = ZomatoModel(source)
+    tmp_path = path + '.tmp'
+    written = 0
+    for chunk, start in enumerate(range(0, n_rows, chunk_size)):
+        # Cada bloco tem seu próprio gerador: o resultado não depende da ordem de execução
+        rng = np.random.default_rng([seed, chunk])
+        df = model.sample(min(chunk_size, n_rows - start), rng, model.next_id + start)
+        df.to_csv(tmp_path, mode='w' if chunk == 0 else 'a', header=chunk == 0, index=False)
+        written += len(df)
+    os.replace(tmp_path, path)
+    return written
+
+def generate_dataset(n_rows, directory, seed=42, chunk_size=CHUNK_SIZE):
+    """Cria uma pasta de dataset (zomato.csv sintético e currencies.csv) para ZOMATO_DATASET_DIR"""
+    os.makedirs(directory, exist_ok=True)
+    shutil.copyfile(CURRENCIES_PATH, os.path.join(directory, 'currencies.csv'))
+    return generate(n_rows, os.path.join(directory, 'zomato.csv'), seed, chunk_size)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gera um zomato.csv sintético')
+    parser.add_argument('rows', type=int, help='quantidade de linhas')
+    parser.add_argument('--output', required=True, help='pasta do dataset (zomato.csv e currencies.csv)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    written = generate_dataset(args.rows, args.output, args.seed, args.chunk_size)
+    print(f'{written} linhas em {time.perf_counter() - start:.1f}s: {os.path.join(args.output, "zomato.csv")}')
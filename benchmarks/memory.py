@@ -0,0 +1,98 @@
+"""
+Teste de carga de memória: sessões do dashboard abertas ao mesmo tempo no mesmo
+processo (Streamlit AppTest).
+
+Cada sessão roda uma página com um dos cenários do benchmark das páginas e fica
+aberta (o estado da sessão é mantido até o fim do teste), como um usuário
+conectado ao servidor. A memória do processo é medida depois de 1, 10, 50, 100 e
+200 sessões: como o df1, os índices e as métricas são carregados uma única vez
+por processo, ela deve ficar estável. Termina com erro se a memória própria do
+processo crescer mais que --max-growth-mb entre a primeira e a última medição.
+
+rss é toda a memória residente; private é a parte que só este processo usa. As
+páginas da cópia mapeada do dataset (ZOMATO_MMAP) contam no rss, mas deixam de
+ser privadas quando outro processo do servidor mapeia o mesmo arquivo.
+
+Uso:
+    python -m benchmarks.memory
+    ZOMATO_DATASET_DIR=pasta_do_dataset python -m benchmarks.memory --sessions 1 50 200
+    ZOMATO_MMAP=0 python -m benchmarks.memory
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+import warnings
+
+from benchmarks.pages import SCENARIOS, set_widgets
+from utils.paths import BASE_DIR
+
+def memory_mb():
+    """Memória residente e memória própria do processo, em MB"""
+    try:
+        with open('/proc/self/smaps_rollup') as file:
+            fields = {}
+            for line in file:
+                name, value = line.split()[:2]
+                if value.isdigit():
+                    fields[name.rstrip(':')] = int(value)
+        return {'rss': fields['Rss'] / 1024,
+                'private': (fields['Private_Clean'] + fields['Private_Dirty']) / 1024}
+    except OSError:
+        # Fora do Linux: só o pico da memória residente (em KB no Linux, bytes no macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_mb = peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+        return {'rss': peak_mb, 'private': peak_mb}
+
+def open_session(page, values):
+    """Roda a página com os valores dos widgets e retorna o estado da sessão"""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(BASE_DIR, page), default_timeout=600)
+    at.run()
+    if values:
+        set_widgets(at, values)
+        at.run()
+    if at.exception:
+        raise RuntimeError(f'{page}: {at.exception[0].message}')
+    # Só o estado da sessão fica com o servidor; os elementos da página vão para o navegador
+    return at.session_state
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50, 100, 200],
+                        help='quantidades de sessões abertas em que a memória é medida')
+    parser.add_argument('--max-growth-mb', type=float, default=50.0,
+                        help='crescimento máximo da memória própria entre a primeira e a última medição')
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    scenarios = [(page, values) for page, pages in SCENARIOS.items() for values in pages.values()]
+    # Aquecimento: carrega o dataset, os índices e as métricas e enche os caches de
+    # figuras e de consultas com todos os cenários, antes da primeira medição
+    start = time.perf_counter()
+    for page, values in scenarios:
+        open_session(page, values)
+    print(f'aquecimento: {len(scenarios)} cenários em {time.perf_counter() - start:.1f} s', file=sys.stderr)
+
+    sessions = []
+    results = []
+    for target in sorted(args.sessions):
+        start = time.perf_counter()
+        while len(sessions) < target:
+            page, values = scenarios[len(sessions) % len(scenarios)]
+            sessions.append(open_session(page, values))
+        gc.collect()
+        memory = memory_mb()
+        results.append(memory)
+        growth = memory['private'] - results[0]['private']
+        print(f"{target:5d} sessões rss={memory['rss']:8.1f} MB private={memory['private']:8.1f} MB "
+              f"crescimento={growth:6.1f} MB ({time.perf_counter() - start:.1f} s)")
+    growth = results[-1]['private'] - results[0]['private']
+    per_session = growth / max(len(sessions) - min(args.sessions), 1) * 1024
+    print(f'crescimento de {growth:.1f} MB ({per_session:.1f} KB por sessão); limite {args.max_growth_mb:.1f} MB')
+    return 1 if growth > args.max_growth_mb else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
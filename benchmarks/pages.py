@@ -0,0 +1,306 @@
+"""
+Benchmark das páginas do dashboard rodando sem navegador (Streamlit AppTest).
+
+Mede, para cada página, seleção dos filtros e tamanho de dataset, o tempo
+exclusivo de cada etapa (load, clean, aggregate, figure, map e o restante da
+página) na primeira execução (cache do processo vazio) e nas reexecuções.
+
+Uso:
+    python -m benchmarks.pages --scales 1 10 --output bench.json
+    python -m benchmarks.pages --scales 1 10 --output new.json --compare bench.json
+    python -m benchmarks.pages --scales 1 --rows 100000 1000000 --output big.json
+    ZOMATO_BACKEND=arrow python -m benchmarks.pages --scales 1 10 --output arrow.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from benchmarks.generate import generate_dataset
+from utils.paths import BASE_DIR, ZOMATO_PATH, CURRENCIES_PATH
+
+# ====================================================================================
+# Cenários
+# ====================================================================================
+ALL_COUNTRIES = ['India', 'Australia', 'Brazil', 'Canada', 'Indonesia', 'New Zeland', 'Philippines',
+                 'Qatar', 'Singapure', 'South Africa', 'Sri Lanka', 'Turkey', 'United Arab Emirates',
+                 'England', 'United States of America']
+
+# Página -> cenário -> valores dos widgets da página (pelo rótulo). Vazio mantém o padrão
+SCENARIOS = {
+    'Home.py': {
+        'default': {},
+        'all_countries': {'Selecione o(s) país(es) para ver os restaurantes.': ALL_COUNTRIES},
+        'brazil': {'Selecione o(s) país(es) para ver os restaurantes.': ['Brazil']},
+    },
+    'pages/1_Countries.py': {
+        'default': {},
+        'all_countries': {'Selecione o(s) país(es) para ver os restaurantes.': ALL_COUNTRIES},
+        'brazil': {'Selecione o(s) país(es) para ver os restaurantes.': ['Brazil']},
+    },
+    'pages/2_Cities.py': {
+        'default': {},
+        'all_countries': {'Selecione o(s) país(es) para ver os restaurantes.': ALL_COUNTRIES},
+        'brazil': {'Selecione o(s) país(es) para ver os restaurantes.': ['Brazil']},
+    },
+    'pages/3_Cuisines.py': {
+        'default': {},
+        'all_countries': {'Selecione o(s) país(es) para ver os restaurantes.': ALL_COUNTRIES},
+        'italian_20': {'Selecione o(s) tipo(s) de culinária.': ['Italian'],
+                       'Selecione o número de restaurantes para visualizar na tabela.': 20},
+    },
+    'pages/4_Nearby.py': {
+        'default': {},
+        'italian_4': {'Selecione o(s) tipo(s) de culinária.': ['Italian'], 'Nota mínima': 4.0},
+    },
+    'pages/5_Search.py': {
+        'default': {},
+        'typo': {'Nome, cidade ou bairro do restaurante': 'barbeque natoin delhi'},
+    },
+}
+# ====================================================================================
+
+# ====================================================================================
+# Medição das etapas
+# ====================================================================================
+# Etapa -> funções medidas, como (módulo, atributo) ou (módulo, classe, método)
+PHASES = {
+    'load': [('utils.data', 'load_data'), ('utils.data', 'load_derived'), ('utils.data', 'ensure_snapshot')],
+    'clean': [('utils.data', 'clean_data')],
+    'aggregate': [('utils.cube', 'build_cube'), ('utils.cube', 'slice_cube'), ('utils.cube', 'rollup'),
+                  ('utils.metrics', 'build_metrics'),
+                  ('utils.topk', 'top_k'), ('utils.filters', 'select'),
+                  ('utils.filters', 'BitmapFilter', '__init__'), ('utils.filters', 'BitmapFilter', 'rows'),
+                  ('utils.cuisines', 'CuisineIndex', '__init__'), ('utils.cuisines', 'CuisineIndex', 'aggregate'),
+                  ('utils.filters', 'category_mask'),
+                  ('utils.spatial', 'SpatialIndex', '__init__'), ('utils.spatial', 'SpatialIndex', 'nearest'),
+                  ('utils.spatial', 'SpatialIndex', 'within'),
+                  ('utils.search', 'SearchIndex', '__init__'), ('utils.search', 'SearchIndex', 'search'),
+                  ('utils.backend', 'ArrowBackend', '_scan'), ('utils.backend', 'ArrowBackend', '_rollup')],
+    'figure': [('plotly.express', 'bar'), ('plotly.express', 'pie'), ('streamlit', 'plotly_chart')],
+    'map': [('utils.maps', 'map_layer'), ('utils.grid', 'MapGrid', '__init__'), ('streamlit_folium', 'st_folium')],
+}
+
+class PhaseTimer:
+    """
+    Acumula o tempo exclusivo de cada etapa: quando uma função medida chama
+    outra, o tempo da chamada interna é descontado da externa. Cada thread tem a
+    sua pilha de chamadas (o script da página roda em uma thread do Streamlit);
+    os totais são somados de todas as threads
+    """
+    def __init__(self):
+        self.totals = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.totals = {}
+        self._local = threading.local()
+
+    def _stack(self):
+        """Pilha de chamadas medidas da thread atual"""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def wrap(self, phase, func):
+        def timed(*args, **kwargs):
+            stack = self._stack()
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                with self._lock:
+                    self.totals[phase] = self.totals.get(phase, 0.0) + elapsed - children
+                if stack:
+                    stack[-1] += elapsed
+        timed.__wrapped__ = func
+        return timed
+
+    def install(self):
+        """Substitui as funções de PHASES (e as cópias importadas por outros módulos) pela versão medida"""
+        import importlib
+        for phase, targets in PHASES.items():
+            for target in targets:
+                module = importlib.import_module(target[0])
+                if len(target) == 3:
+                    cls = getattr(module, target[1])
+                    setattr(cls, target[2], self.wrap(phase, getattr(cls, target[2])))
+                    continue
+                original = getattr(module, target[1])
+                timed = self.wrap(phase, original)
+                for other in list(sys.modules.values()):
+                    if getattr(other, '__name__', '').split('.')[0] in ('utils', 'streamlit', 'plotly', 'streamlit_folium') \
+                            and getattr(other, target[1], None) is original:
+                        setattr(other, target[1], timed)
+# ====================================================================================
+
+# ====================================================================================
+# Execução das páginas (processo filho, um por dataset)
+# ====================================================================================
+def set_widgets(at, values):
+    """Altera os widgets da página pelos rótulos"""
+    for label, value in values.items():
+        for widget in list(at.multiselect) + list(at.slider) + list(at.text_input):
+            if widget.label == label:
+                widget.set_value(value)
+
+def emit(page, scenario, n_rows, run_type, runs):
+    """Imprime (em JSON, uma linha) a mediana de cada etapa nas execuções runs"""
+    phases = sorted({key for run in runs for key in run})
+    result = {
+        'page': page, 'scenario': scenario, 'rows': n_rows, 'run': run_type,
+        'ms': {key: round(statistics.median(run.get(key, 0.0) for run in runs) * 1000, 3) for key in phases},
+    }
+    print(json.dumps(result), flush=True)
+
+def run_worker(pages, reruns, n_rows):
+    """Roda as páginas com o dataset de ZOMATO_DATASET_DIR e imprime um resultado JSON por linha"""
+    from streamlit.testing.v1 import AppTest
+    from utils import data, figures, metrics
+
+    timer = PhaseTimer()
+    timer.install()
+    # O snapshot é construído uma vez, fora das páginas: a primeira execução de
+    # cada página mede a leitura do snapshot com o cache do processo vazio
+    start = time.perf_counter()
+    data.ensure_snapshot()
+    total = time.perf_counter() - start
+    emit('snapshot', 'build', n_rows, 'cold', [{'total': total, **timer.totals}])
+    # As métricas também são pré-calculadas, como no deploy (python -m utils.metrics)
+    timer.reset()
+    start = time.perf_counter()
+    metrics.precompute()
+    total = time.perf_counter() - start
+    emit('metrics', 'build', n_rows, 'cold', [{'total': total, **timer.totals}])
+    for page in pages:
+        for scenario, values in SCENARIOS[page].items():
+            data.clear_cache()
+            figures.FIGURE_CACHE.clear()
+            at = AppTest.from_file(os.path.join(BASE_DIR, page), default_timeout=600)
+            runs = []
+            for i in range(reruns + 1):
+                timer.reset()
+                start = time.perf_counter()
+                at.run()
+                if i == 0 and values:
+                    # Primeira execução com os valores padrão, depois aplica a seleção
+                    set_widgets(at, values)
+                    at.run()
+                total = time.perf_counter() - start
+                if at.exception:
+                    raise RuntimeError(f'{page} [{scenario}]: {at.exception[0].message}')
+                phases = dict(timer.totals)
+                phases['other'] = max(total - sum(phases.values()), 0.0)
+                runs.append({'total': total, **phases})
+            emit(page, scenario, n_rows, 'cold', runs[:1])
+            if reruns:
+                emit(page, scenario, n_rows, 'warm', runs[1:])
+
+def make_dataset(scale, directory):
+    """Grava em directory o zomato.csv repetido scale vezes (com restaurant_id distintos)"""
+    df = pd.read_csv(ZOMATO_PATH)
+    if scale > 1:
+        offset = int(df['Restaurant ID'].max()) + 1
+        df = pd.concat([df.assign(**{'Restaurant ID': df['Restaurant ID'] + i * offset}) for i in range(scale)],
+                       ignore_index=True)
+    df.to_csv(os.path.join(directory, 'zomato.csv'), index=False)
+    with open(CURRENCIES_PATH, 'rb') as source, open(os.path.join(directory, 'currencies.csv'), 'wb') as target:
+        target.write(source.read())
+    return len(df)
+# ====================================================================================
+
+# ====================================================================================
+# Comparação com a linha de base
+# ====================================================================================
+def compare(results, baseline, threshold, min_ms):
+    """
+    Retorna as regressões: etapas cujo tempo ficou mais que threshold vezes (e mais
+    que min_ms milissegundos) acima da linha de base
+    """
+    def key(result):
+        return (result['page'], result['scenario'], result['rows'], result['run'])
+    base = {key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        reference = base.get(key(result))
+        if reference is None:
+            continue
+        for phase, ms in result['ms'].items():
+            before = reference['ms'].get(phase, 0.0)
+            if ms > before * threshold and ms - before > min_ms:
+                regressions.append({**dict(zip(['page', 'scenario', 'rows', 'run'], key(result))),
+                                    'phase': phase, 'baseline_ms': before, 'ms': ms,
+                                    'ratio': round(ms / before, 2) if before else None})
+    return regressions
+# ====================================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--scales', type=int, nargs='*', default=[1, 10],
+                        help='tamanhos de dataset, em múltiplos do zomato.csv')
+    parser.add_argument('--rows', type=int, nargs='+', default=[],
+                        help='tamanhos de datasets sintéticos (benchmarks.generate), em linhas')
+    parser.add_argument('--seed', type=int, default=42, help='semente dos datasets sintéticos')
+    parser.add_argument('--reruns', type=int, default=5, help='reexecuções medidas depois da primeira')
+    parser.add_argument('--output', default='bench.json', help='arquivo JSON com os resultados')
+    parser.add_argument('--compare', help='arquivo JSON de linha de base para detectar regressões')
+    parser.add_argument('--threshold', type=float, default=1.25, help='razão que caracteriza uma regressão')
+    parser.add_argument('--min-ms', type=float, default=5.0, help='diferença mínima, em ms, para uma regressão')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--n-rows', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.pages, args.reruns, args.n_rows)
+        return
+
+    results = []
+    datasets = [('scale', scale) for scale in args.scales] + [('rows', rows) for rows in args.rows]
+    for kind, size in datasets:
+        with tempfile.TemporaryDirectory() as directory:
+            if kind == 'scale':
+                n_rows = make_dataset(size, directory)
+                print(f'dataset x{size}: {n_rows} linhas', file=sys.stderr)
+            else:
+                n_rows = generate_dataset(size, directory, args.seed)
+                print(f'dataset sintético: {n_rows} linhas', file=sys.stderr)
+            # Um processo por dataset, para que o cache de um não contamine o outro
+            env = dict(os.environ, ZOMATO_DATASET_DIR=directory)
+            command = [sys.executable, '-m', 'benchmarks.pages', '--worker', '--n-rows', str(n_rows),
+                       '--reruns', str(args.reruns), '--pages', *args.pages]
+            output = subprocess.run(command, env=env, cwd=BASE_DIR, check=True,
+                                    stdout=subprocess.PIPE, text=True).stdout
+            for line in output.splitlines():
+                if line.startswith('{'):
+                    result = json.loads(line)
+                    results.append(result)
+                    print(f"{result['page']:22s} {result['scenario']:14s} {result['rows']:>9} {result['run']:4s} "
+                          + ' '.join(f'{phase}={ms:.1f}' for phase, ms in result['ms'].items()), file=sys.stderr)
+
+    with open(args.output, 'w') as file:
+        json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold, args.min_ms)
+        for regression in regressions:
+            print('REGRESSÃO: ' + json.dumps(regression), file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import folium
+import numpy as np
+import streamlit as st
+from streamlit_folium import st_folium
+
+from utils.backend import load_backend
+from utils.data import load_data
+from utils.filters import load_bitmap_filter, select
+from utils.maps import DataLayer, MARKER_CALLBACK, map_points
+from utils.spatial import load_spatial_index
+from utils.tracing import start_trace, span, traced, finish_trace
+
+# ====================================================================================
+# Defining functions
+# ====================================================================================
+@traced('render.mapa')
+def nearby_map(latitude, longitude, restaurants, radius_km=None):
+    """Mapa com o ponto de referência, os restaurantes encontrados e o raio da busca"""
+    fig = folium.Map(location=[latitude, longitude], zoom_start=13)
+    folium.Marker([latitude, longitude], tooltip='Ponto de referência',
+                  icon=folium.Icon(color='red', icon='star')).add_to(fig)
+    if radius_km is not None:
+        folium.Circle([latitude, longitude], radius=radius_km * 1000, color='#CB202D', fill=False).add_to(fig)
+    DataLayer(map_points(restaurants), MARKER_CALLBACK, name='Restaurantes').add_to(fig)
+    if len(restaurants) > 0:
+        fig.fit_bounds([[min(restaurants['latitude'].min(), latitude), min(restaurants['longitude'].min(), longitude)],
+                        [max(restaurants['latitude'].max(), latitude), max(restaurants['longitude'].max(), longitude)]])
+    return fig
+# ====================================================================================
+
+# ====================================================================================
+# Data loading and cleaning
+# ====================================================================================
+# O índice espacial é construído uma única vez por processo: cada busca só mede a
+# distância dos restaurantes das células em volta do ponto. A busca devolve posições
+# de linhas do df1, então a página usa o df1 nos dois backends; as listas de países,
+# cidades e culinárias vêm do backend de consultas (ZOMATO_BACKEND).
+# Tempos de cada seção (painel na barra lateral com ?debug=1 ou ZOMATO_TRACE=1)
+start_trace('Nearby')
+with span('load'):
+    cols = ['restaurant_id', 'restaurant_name', 'country_name', 'city', 'all_cuisines',
+            'average_cost_for_two_us_dollar', 'aggregate_rating', 'votes', 'latitude', 'longitude']
+    df1 = load_data(cols)
+    backend = load_backend()
+    countries = backend.countries()
+    cities = backend.cities()
+    cuisines = backend.cuisines()
+    bitmap_filter = load_bitmap_filter()
+    spatial_index = load_spatial_index()
+# ====================================================================================
+
+# ====================================================================================
+# Main Page
+# ====================================================================================
+st.set_page_config(
+    page_title='Visão Proximidade',
+    page_icon=':round_pushpin:',
+    layout='wide'
+)
+# ====================================================================================
+
+# ====================================================================================
+# Side bar
+# ====================================================================================
+#image = Image.open('logo.jpeg')
+#st.sidebar.image(image, width=120)
+st.sidebar.markdown('<h2 style="text-align: center"> Fome Zero Company </h2>', unsafe_allow_html=True)
+st.sidebar.markdown("""___""")
+
+# Ponto de referência: um restaurante cadastrado ou coordenadas quaisquer
+reference = st.sidebar.radio('Ponto de referência', ['Restaurante', 'Coordenadas'])
+if reference == 'Restaurante':
+    country = st.sidebar.selectbox('Selecione o país.', countries.sort_values(by='order')['country_name'])
+    city = st.sidebar.selectbox('Selecione a cidade.', cities.loc[cities['country_name'] == country, 'city'])
+    with span('aggregate.restaurantes'):
+        rows = bitmap_filter.rows(country_name=[country], city=[city])
+        df_aux = select(df1, rows, ['restaurant_id', 'restaurant_name']).assign(position=rows)
+        df_aux = df_aux.drop_duplicates(subset='restaurant_id').sort_values(by='restaurant_name')
+    # As opções são as posições das linhas no df1 (nomes podem se repetir)
+    position = st.sidebar.selectbox('Selecione o restaurante.', df_aux['position'],
+                                    format_func=lambda position: df1['restaurant_name'].iat[position])
+    latitude = float(df1['latitude'].iat[position]) if position is not None else 0.0
+    longitude = float(df1['longitude'].iat[position]) if position is not None else 0.0
+else:
+    latitude = st.sidebar.number_input('Latitude', min_value=-90.0, max_value=90.0, value=28.6139, format='%.4f')
+    longitude = st.sidebar.number_input('Longitude', min_value=-180.0, max_value=180.0, value=77.2090, format='%.4f')
+st.sidebar.markdown("""___""")
+
+search = st.sidebar.radio('Busca', ['Mais próximos', 'Dentro de um raio'])
+if search == 'Mais próximos':
+    k = st.sidebar.slider('Quantidade de restaurantes', value=10, min_value=1, max_value=50)
+else:
+    radius_km = st.sidebar.slider('Raio (km)', value=2.0, min_value=0.5, max_value=50.0, step=0.5)
+cuisines_selector = st.sidebar.multiselect('Selecione o(s) tipo(s) de culinária.', cuisines['cuisines'])
+min_rating = st.sidebar.slider('Nota mínima', value=0.0, min_value=0.0, max_value=5.0, step=0.1)
+
+# Busca no índice espacial
+with span('aggregate.busca'):
+    if search == 'Mais próximos':
+        positions, distances = spatial_index.nearest(latitude, longitude, k, cuisines_selector, min_rating)
+    else:
+        positions, distances = spatial_index.within(latitude, longitude, radius_km, cuisines_selector, min_rating)
+    restaurants = df1.take(positions).assign(distance_km=np.round(distances, 2))
+# ====================================================================================
+
+# ====================================================================================
+# Page
+# ====================================================================================
+st.markdown('<h1 style="text-align: center"> Restaurantes próximos </h1>', unsafe_allow_html=True)
+st.markdown("""___""")
+
+with st.container(), span('render.tabela'):
+    st.markdown(f'<h3> Restaurantes encontrados: {len(restaurants)} </h3>', unsafe_allow_html=True)
+    cols = ['restaurant_name', 'distance_km', 'country_name', 'city', 'all_cuisines',
+            'average_cost_for_two_us_dollar', 'aggregate_rating', 'votes']
+    st.dataframe(restaurants.loc[:, cols].rename(columns={'all_cuisines': 'cuisines'}), hide_index=True)
+
+with st.container():
+    fig = nearby_map(latitude, longitude, restaurants, radius_km if search == 'Dentro de um raio' else None)
+    with span('render.st_folium'):
+        st_folium(fig, key='proximos', returned_objects=[], width=1150, height=500)
+
+finish_trace()
@@ -0,0 +1,68 @@
+import numpy as np
+import streamlit as st
+
+from utils.data import load_data
+from utils.search import load_search_index
+from utils.tracing import start_trace, span, finish_trace
+
+# ====================================================================================
+# Data loading and cleaning
+# ====================================================================================
+# O índice de trigramas é construído uma única vez por processo: cada busca só lê
+# as listas dos trigramas digitados, sem varrer os nomes.
+# Tempos de cada seção (painel na barra lateral com ?debug=1 ou ZOMATO_TRACE=1)
+start_trace('Search')
+with span('load'):
+    cols = ['restaurant_id', 'restaurant_name', 'country_name', 'city', 'locality', 'all_cuisines',
+            'average_cost_for_two_us_dollar', 'aggregate_rating', 'votes']
+    df1 = load_data(cols)
+    search_index = load_search_index()
+# ====================================================================================
+
+# ====================================================================================
+# Main Page
+# ====================================================================================
+st.set_page_config(
+    page_title='Busca de restaurantes',
+    page_icon=':mag:',
+    layout='wide'
+)
+# ====================================================================================
+
+# ====================================================================================
+# Side bar
+# ====================================================================================
+#image = Image.open('logo.jpeg')
+#st.sidebar.image(image, width=120)
+st.sidebar.markdown('<h2 style="text-align: center"> Fome Zero Company </h2>', unsafe_allow_html=True)
+st.sidebar.markdown("""___""")
+# ====================================================================================
+
+# ====================================================================================
+# Page
+# ====================================================================================
+st.markdown('<h1 style="text-align: center"> Busca de restaurantes </h1>', unsafe_allow_html=True)
+st.markdown("""___""")
+
+col1, col2 = st.columns([3, 1], gap='medium')
+with col1:
+    query = st.text_input('Nome, cidade ou bairro do restaurante', placeholder='Ex.: barbeque nation delhi')
+with col2:
+    qtd_restaurant = st.slider('Quantidade de resultados', value=10, min_value=5, max_value=50)
+
+# Busca no índice de trigramas (tolera erros de digitação)
+with span('aggregate.busca'):
+    positions, scores = search_index.search(query, qtd_restaurant)
+    restaurants = df1.take(positions).assign(score=np.round(scores, 2))
+
+with st.container(), span('render.tabela'):
+    if not query.strip():
+        st.markdown('Digite o nome, a cidade ou o bairro do restaurante.')
+    elif len(restaurants) == 0:
+        st.markdown('Nenhum restaurante encontrado.')
+    else:
+        cols = ['restaurant_name', 'score', 'country_name', 'city', 'locality', 'all_cuisines',
+                'average_cost_for_two_us_dollar', 'aggregate_rating', 'votes']
+        st.dataframe(restaurants.loc[:, cols].rename(columns={'all_cuisines': 'cuisines'}), hide_index=True)
+
+finish_trace()
@@ -0,0 +1,90 @@
+"""
+Paridade dos backends de consulta (utils.backend).
+
+Cada consulta das páginas precisa dar o mesmo resultado no backend pandas (métricas
+calculadas a partir do df1) e no arrow (pyarrow no snapshot), com a mesma
+comparação do benchmarks.backends. Também confere a camada do mapa e o snapshot
+depois de uma atualização incremental (utils.upsert).
+
+Uso:
+    python -m pytest
+"""
+import shutil
+
+import pandas as pd
+import pytest
+
+from benchmarks.backends import compare, selections
+from utils.backend import ArrowBackend, PandasBackend
+from utils.cube import CUBE_COLUMNS, build_cube
+from utils.data import clear_cache, ensure_snapshot, load_data
+from utils.maps import map_layer
+from utils.metrics import METRIC_COLUMNS, build_metrics
+from utils.paths import CURRENCIES_PATH, ZOMATO_PATH
+from utils.upsert import upsert
+
+# Consultas sem seleção e consultas por seleção de países
+TABLES = ['overview', 'cuisines', 'top_rated', 'best_restaurants']
+QUERIES = [(name, None) for name in TABLES] + \
+    [(name, selection) for name in ['countries', 'cities'] for selection in selections()]
+
+# Visões do mapa (zoom, área): células da grade, restaurantes e uma área que cruza o antimeridiano
+MAP_VIEWS = [(0, None), (6, (20.0, 70.0, 32.0, 80.0)), (13, (28.4, 76.8, 28.9, 77.5)), (14, (-1.0, 170.0, 1.0, 190.0))]
+
+# Colunas dos restaurantes do mapa
+MAP_COLUMNS = ['restaurant_name', 'latitude', 'longitude']
+
+def query(backend, name, selection):
+    """Resultado da consulta name no backend"""
+    if name in TABLES:
+        return getattr(backend, name)()
+    return getattr(backend, name)(selection)
+
+def pandas_backend(zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH):
+    """Backend pandas com as métricas calculadas agora, e não lidas dos arquivos do utils.metrics"""
+    df1 = load_data(METRIC_COLUMNS, zomato_path, currencies_path)
+    cube = build_cube(load_data(CUBE_COLUMNS, zomato_path, currencies_path))
+    return PandasBackend(build_metrics(df1, cube))
+
+@pytest.fixture(scope='module')
+def backends():
+    """Os dois backends sobre o dataset configurado (ZOMATO_PATH)"""
+    clear_cache()
+    files = ensure_snapshot()
+    yield pandas_backend(), ArrowBackend(files, cache_size=0)
+    clear_cache()
+
+@pytest.mark.parametrize('name, selection', QUERIES)
+def test_query(backends, name, selection):
+    expected, result = (query(backend, name, selection) for backend in backends)
+    error = compare(expected, result)
+    assert error is None, error
+
+@pytest.mark.parametrize('view', MAP_VIEWS)
+@pytest.mark.parametrize('selection', [['India', 'Brazil'], ['Australia'], []])
+def test_map_layer(backends, selection, view):
+    expected, result = (map_layer(view, backend.map_grid(), backend.restaurants(MAP_COLUMNS, selection), selection)
+                        for backend in backends)
+    assert expected.data_json == result.data_json
+
+def test_upsert(tmp_path):
+    """Depois de uma atualização, o arrow lê as partes do snapshot sem as linhas substituídas"""
+    zomato_path = shutil.copy(ZOMATO_PATH, tmp_path)
+    currencies_path = shutil.copy(CURRENCIES_PATH, tmp_path)
+    raw = pd.read_csv(zomato_path)
+    # Três restaurantes alterados e um novo, de uma culinária que não existia
+    changed = raw.drop_duplicates('Restaurant ID').iloc[[0, 10, 20]].assign(**{'Aggregate rating': 1.0, 'Votes': 7})
+    new = raw.iloc[[1]].assign(**{'Restaurant ID': 10**9, 'Cuisines': 'Martian'})
+    pd.concat([changed, new]).to_csv(tmp_path / 'delta.csv', index=False)
+    try:
+        clear_cache()
+        upsert(tmp_path / 'delta.csv', zomato_path, currencies_path)
+        files = ensure_snapshot(zomato_path, currencies_path)
+        backends = pandas_backend(zomato_path, currencies_path), ArrowBackend(files, cache_size=0)
+        assert 'Martian' in set(backends[1].cuisines()['cuisines'])
+        for name, selection in QUERIES:
+            expected, result = (query(backend, name, selection) for backend in backends)
+            error = compare(expected, result)
+            assert error is None, f'{name} {selection}: {error}'
+    finally:
+        clear_cache()
@@ -0,0 +1 @@
+"""Módulos compartilhados entre a Home.py e as páginas do dashboard."""
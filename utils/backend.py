@@ -0,0 +1,282 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from utils.cube import MEASURES
+from utils.data import compact_dtypes, load_data, load_derived, replaced_ids, snapshot_files
+from utils.filters import load_bitmap_filter, select
+from utils.grid import GRID_COLUMNS, MapGrid, load_map_grid
+from utils.metrics import RESTAURANT_COLUMNS, TOP_RATED_COLUMNS, best_restaurants, load_metrics, top_rated
+
+# ====================================================================================
+# Backends de consulta das métricas das páginas
+# ====================================================================================
+# Com ZOMATO_BACKEND=pandas (padrão), as páginas leem as métricas pré-calculadas
+# (utils.metrics) e os filtros recortam as tabelas em memória. Com
+# ZOMATO_BACKEND=arrow, as mesmas métricas são calculadas pelo motor de consultas
+# do pyarrow (Acero) direto no snapshot Parquet, sem carregar o df1: só as colunas
+# usadas são lidas, o filtro de países é aplicado na leitura (grupos de linhas de
+# outros países são pulados pelas estatísticas do arquivo) e a leitura e os
+# agrupamentos usam todos os núcleos. A grade do mapa, os restaurantes do mapa e a
+# tabela de melhores restaurantes também saem do backend: no arrow, montados a
+# partir das colunas lidas do snapshot, com as linhas na ordem do df1.
+BACKEND_ENV = 'ZOMATO_BACKEND'
+BACKENDS = ['pandas', 'arrow']
+
+# Quantidade de consultas guardadas no cache LRU do backend arrow
+CACHE_SIZE = 256
+
+# Colunas do snapshot lidas pelas métricas de países e cidades
+ROLLUP_COLUMNS = ['country_name', 'city', 'cuisines', 'restaurant_id', 'votes',
+                  'aggregate_rating', 'average_cost_for_two_us_dollar']
+
+def backend_name():
+    """Backend escolhido na variável de ambiente ZOMATO_BACKEND"""
+    name = os.environ.get(BACKEND_ENV, '') or 'pandas'
+    if name not in BACKENDS:
+        raise ValueError(f'{BACKEND_ENV}={name}: use um de {BACKENDS}')
+    return name
+
+def _select(table, countries):
+    """Linhas dos países selecionados (todas, se countries for None)"""
+    if countries is None:
+        return table
+    return table.loc[table['country_name'].isin(countries), :]
+
+def _selection(countries):
+    """Seleção normalizada: a ordem e as repetições dos países não importam"""
+    return None if countries is None else tuple(sorted(set(countries)))
+
+class PandasBackend:
+    """Métricas pré-calculadas pelo utils.metrics, recortadas em memória"""
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def overview(self):
+        """Números gerais da empresa (uma linha)"""
+        return self.metrics['overview']
+
+    def countries(self, countries=None):
+        """Medidas de cada país, com a ordem de aparição do país no dataset"""
+        return _select(self.metrics['countries'], countries)
+
+    def cities(self, countries=None):
+        """Medidas de cada cidade dos países selecionados"""
+        return _select(self.metrics['cities'], countries)
+
+    def cuisines(self):
+        """Nota média de cada culinária, considerando todas as culinárias de cada restaurante"""
+        return self.metrics['cuisines']
+
+    def top_rated(self):
+        """Os 5 restaurantes com maior nota do dataset"""
+        return self.metrics['top_rated']
+
+    def best_restaurants(self):
+        """Os melhores restaurantes de cada país e culinária (utils.metrics.best_restaurants)"""
+        return self.metrics['best_restaurants']
+
+    def map_grid(self):
+        """Grade de restaurantes do mapa (utils.grid), construída uma única vez por processo"""
+        return load_map_grid()
+
+    def restaurants(self, columns, countries):
+        """Colunas do df1, só das linhas dos países selecionados (filtro de bitmaps)"""
+        return select(load_data(columns), load_bitmap_filter().rows(country_name=countries))
+
+class ArrowBackend:
+    """
+    Calcula as mesmas tabelas do PandasBackend com o pyarrow, lendo do snapshot só
+    as colunas e as linhas necessárias. As consultas recentes ficam em um cache LRU
+    """
+    def __init__(self, files, cache_size=CACHE_SIZE):
+        # Cada parte do snapshot, com os restaurant_id substituídos por partes seguintes
+        self.parts = [(ds.dataset(path, format='parquet'), replaced)
+                      for path, replaced in zip(files, replaced_ids(files))]
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        # Ordem dos países nos seletores: a ordem de aparição no dataset
+        country_name = self._scan(['country_name'])['country_name']
+        self.country_order = pd.Index(pc.unique(country_name).to_pylist())
+
+    def _cached(self, key, builder):
+        """Resultado da consulta key, calculado com builder() só se ele não estiver no cache"""
+        with self._lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        result = builder()
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _scan(self, columns, countries=None):
+        """
+        Lê as colunas das partes do snapshot, só das linhas dos países selecionados e
+        sem as linhas substituídas. As colunas de dicionário viram texto, porque cada
+        bloco do arquivo pode ter o seu dicionário
+        """
+        tables = []
+        for dataset, replaced in self.parts:
+            where = None if countries is None else pc.field('country_name').isin(pa.array(list(countries), pa.string()))
+            if len(replaced):
+                ids = pa.array(replaced).cast(dataset.schema.field('restaurant_id').type)
+                current = ~pc.field('restaurant_id').isin(ids)
+                where = current if where is None else where & current
+            table = dataset.to_table(columns=columns, filter=where, use_threads=True)
+            for i, field in enumerate(table.schema):
+                if pa.types.is_dictionary(field.type):
+                    table = table.set_column(i, field.name, table[field.name].cast(pa.string()))
+            tables.append(table)
+        # As partes podem ter inteiros de tamanhos diferentes
+        return pa.concat_tables(tables, promote_options='permissive')
+
+    def _frame(self, columns, countries=None):
+        """Colunas do snapshot como dataframe, com os tipos do df1 e as linhas na ordem do df1"""
+        return compact_dtypes(self._scan(columns, countries).to_pandas())
+
+    def _rollup(self, by, countries=None):
+        """As mesmas medidas de utils.cube.rollup, agrupadas pelo Acero nas colunas de by"""
+        table = self._scan(ROLLUP_COLUMNS, countries)
+        # As notas têm uma casa decimal; o arredondamento desfaz o erro do float32
+        rating = pc.round(table['aggregate_rating'].cast(pa.float64()), 1)
+        table = pa.table({
+            **{col: table[col] for col in ['country_name', 'city', 'cuisines', 'restaurant_id']},
+            'votes': table['votes'].cast(pa.int64()),
+            'rating': rating,
+            'rating_nonzero': pc.not_equal(rating, 0.0).cast(pa.int64()),
+            'rating_above_4': pc.greater(rating, 4.0).cast(pa.int64()),
+            'rating_below_2_5': pc.less(rating, 2.5).cast(pa.int64()),
+            'cost': table['average_cost_for_two_us_dollar'].cast(pa.float64()),
+        })
+        aggregations = [
+            ('restaurant_id', 'count', pc.CountOptions(mode='all'), 'restaurants'),
+            ('restaurant_id', 'count_distinct', None, 'distinct_restaurants'),
+            ('votes', 'sum', None, 'votes'),
+            ('rating', 'sum', None, 'rating_sum'),
+            ('rating', 'count', None, 'rating_count'),
+            ('rating_nonzero', 'sum', None, 'rating_nonzero_count'),
+            ('rating_above_4', 'sum', None, 'rating_above_4'),
+            ('rating_below_2_5', 'sum', None, 'rating_below_2_5'),
+            ('cost', 'sum', None, 'cost_sum'),
+            ('cost', 'count', None, 'cost_count'),
+        ]
+        for dimension, name in [('city', 'cities'), ('cuisines', 'n_cuisines')]:
+            if dimension not in by:
+                aggregations.append((dimension, 'count_distinct', None, name))
+        result = table.group_by(by, use_threads=True).aggregate(
+            [(col, func, options) for col, func, options, _ in aggregations])
+        df_aux = result.rename_columns({f'{col}_{func}': name for col, func, _, name in aggregations}).to_pandas()
+        # Mesma ordem de linhas e de colunas do rollup do cubo
+        columns = by + MEASURES + [name for _, _, _, name in aggregations[len(MEASURES):]]
+        df_aux = df_aux.loc[:, columns].sort_values(by=by, kind='stable').reset_index(drop=True)
+        df_aux['rating_mean'] = df_aux['rating_sum'] / df_aux['rating_count']
+        # Média das notas diferentes de zero: as notas zero não alteram a soma
+        df_aux['rating_nonzero_mean'] = df_aux['rating_sum'] / df_aux['rating_nonzero_count'].replace(0, np.nan)
+        df_aux['cost_mean'] = df_aux['cost_sum'] / df_aux['cost_count']
+        return df_aux.astype({col: 'category' for col in by})
+
+    def overview(self):
+        """Números gerais da empresa (uma linha)"""
+        def build():
+            table = self._scan(['restaurant_id', 'country_name', 'city', 'votes', 'cuisines'])
+            return pd.DataFrame({
+                'restaurants': [pc.count_distinct(table['restaurant_id']).as_py()],
+                'countries': [pc.count_distinct(table['country_name']).as_py()],
+                'cities': [pc.count_distinct(table['city']).as_py()],
+                'votes': [pc.sum(table['votes'].cast(pa.int64())).as_py() or 0],
+                'cuisines': [pc.count_distinct(table['cuisines']).as_py()],
+            })
+        return self._cached(('overview',), build)
+
+    def countries(self, countries=None):
+        """Medidas de cada país, com a ordem de aparição do país no dataset"""
+        def build():
+            df_aux = self._rollup(['country_name'], countries)
+            df_aux['order'] = self.country_order.get_indexer(df_aux['country_name'].astype(str))
+            return df_aux
+        return self._cached(('countries', _selection(countries)), build)
+
+    def cities(self, countries=None):
+        """Medidas de cada cidade dos países selecionados"""
+        return self._cached(('cities', _selection(countries)), lambda: self._rollup(['country_name', 'city'], countries))
+
+    def cuisines(self):
+        """Nota média de cada culinária, considerando todas as culinárias de cada restaurante"""
+        def build():
+            table = self._scan(['all_cuisines', 'aggregate_rating'])
+            rating = pc.round(table['aggregate_rating'].cast(pa.float64()), 1)
+            nonzero = pc.not_equal(rating, 0.0)
+            table = pa.table({
+                'all_cuisines': table['all_cuisines'],
+                'rating': rating,
+                'nonzero_rating': pc.if_else(nonzero, rating, 0.0),
+                'nonzero': nonzero.cast(pa.int64()),
+            })
+            # Primeiro por combinação de culinárias (poucas), depois por culinária
+            combos = table.group_by('all_cuisines', use_threads=True).aggregate([
+                ('rating', 'sum'), ('rating', 'count', pc.CountOptions(mode='all')),
+                ('nonzero_rating', 'sum'), ('nonzero', 'sum')])
+            combos = combos.filter(pc.is_valid(combos['all_cuisines']))
+            cuisines = pc.split_pattern(combos['all_cuisines'], ',')
+            parents = pc.list_parent_indices(cuisines)
+            exploded = combos.drop_columns(['all_cuisines']).take(parents).append_column(
+                'cuisines', pc.utf8_trim_whitespace(pc.list_flatten(cuisines)))
+            exploded = exploded.filter(pc.not_equal(exploded['cuisines'], ''))
+            df_aux = exploded.group_by('cuisines', use_threads=True).aggregate([
+                ('rating_sum', 'sum'), ('rating_count', 'sum'),
+                ('nonzero_rating_sum', 'sum'), ('nonzero_sum', 'sum')]).to_pandas()
+            df_aux = df_aux.sort_values(by='cuisines', kind='stable').reset_index(drop=True)
+            cuisines = pd.DataFrame({
+                'cuisines': df_aux['cuisines'],
+                'sum': df_aux['rating_sum_sum'],
+                'count': df_aux['rating_count_sum'],
+            })
+            cuisines['rating_mean'] = cuisines['sum'] / cuisines['count']
+            cuisines['nonzero_sum'] = df_aux['nonzero_rating_sum_sum']
+            cuisines['nonzero_count'] = df_aux['nonzero_sum_sum']
+            cuisines['rating_nonzero_mean'] = cuisines['nonzero_sum'] / cuisines['nonzero_count'].replace(0, np.nan)
+            return cuisines
+        return self._cached(('cuisines',), build)
+
+    def top_rated(self):
+        """Os 5 restaurantes com maior nota do dataset"""
+        return self._cached(('top_rated',), lambda: top_rated(self._frame(TOP_RATED_COLUMNS)))
+
+    def best_restaurants(self):
+        """Os melhores restaurantes de cada país e culinária, com as posições das linhas no df1"""
+        return self._cached(('best_restaurants',), lambda: best_restaurants(self._frame(RESTAURANT_COLUMNS)))
+
+    def map_grid(self):
+        """Grade de restaurantes do mapa, construída com as colunas lidas do snapshot"""
+        return self._cached(('map_grid',), lambda: MapGrid(self._frame(GRID_COLUMNS)))
+
+    def restaurants(self, columns, countries):
+        """Colunas do snapshot, só das linhas dos países selecionados"""
+        return self._cached(('restaurants', tuple(columns), _selection(countries)),
+                            lambda: self._frame(columns, countries))
+
+def load_backend():
+    """
+    Retorna o backend configurado em ZOMATO_BACKEND. O backend arrow é criado uma
+    única vez por versão do dataset e não carrega o df1
+    """
+    if backend_name() == 'pandas':
+        return PandasBackend(load_metrics())
+    return load_derived('arrow_backend', None,
+                        reader=lambda name, content_hash, zomato_path: ArrowBackend(snapshot_files(zomato_path)))
+# ====================================================================================
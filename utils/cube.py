@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+from utils.data import load_derived
+
+# ====================================================================================
+# Cubo de agregados por país / cidade / culinária
+# ====================================================================================
+DIMENSIONS = ['country_name', 'city', 'cuisines']
+
+# Colunas do df1 necessárias para montar o cubo
+CUBE_COLUMNS = DIMENSIONS + ['restaurant_id', 'votes', 'aggregate_rating', 'average_cost_for_two_us_dollar']
+
+# Medidas do cubo. Todas são somáveis, então qualquer recorte é respondido somando
+# as células. O número de restaurantes distintos também é somável porque cada
+# restaurant_id pertence a uma única célula (país, cidade, culinária).
+MEASURES = ['restaurants', 'distinct_restaurants', 'votes',
+            'rating_sum', 'rating_count', 'rating_nonzero_count',
+            'rating_above_4', 'rating_below_2_5',
+            'cost_sum', 'cost_count']
+
+def build_cube(df1, first_seen=None):
+    """
+    Agrupa o df1 nas células (país, cidade, culinária) com as medidas do cubo.
+    first_seen marca a primeira linha de cada restaurant_id (quando o df1 é só um
+    bloco do dataset); sem ele, os restaurantes distintos são contados no df1
+    """
+    # As somas são acumuladas em 64 bits, mesmo com as colunas compactas do df1. As
+    # notas têm uma casa decimal, então o arredondamento desfaz o erro do float32.
+    df_aux = df1.loc[:, CUBE_COLUMNS].astype({
+        'votes': 'int64',
+        'aggregate_rating': 'float64',
+        'average_cost_for_two_us_dollar': 'float64'})
+    df_aux['aggregate_rating'] = df_aux['aggregate_rating'].round(1)
+    rating = df_aux['aggregate_rating']
+    df_aux = df_aux.assign(
+        rating_nonzero=(rating != 0.0),
+        rating_above_4=(rating > 4),
+        rating_below_2_5=(rating < 2.5))
+    if first_seen is None:
+        distinct = ('restaurant_id', 'nunique')
+    else:
+        df_aux['first_seen'] = np.asarray(first_seen, dtype=bool)
+        distinct = ('first_seen', 'sum')
+    # sort=False mantém a ordem de aparição dos grupos, a mesma do unique() no df1
+    cube = df_aux.groupby(DIMENSIONS, sort=False, observed=True).agg(
+        restaurants=('restaurant_id', 'size'),
+        distinct_restaurants=distinct,
+        votes=('votes', 'sum'),
+        rating_sum=('aggregate_rating', 'sum'),
+        rating_count=('aggregate_rating', 'count'),
+        rating_nonzero_count=('rating_nonzero', 'sum'),
+        rating_above_4=('rating_above_4', 'sum'),
+        rating_below_2_5=('rating_below_2_5', 'sum'),
+        cost_sum=('average_cost_for_two_us_dollar', 'sum'),
+        cost_count=('average_cost_for_two_us_dollar', 'count'))
+    return cube.reset_index()
+
+class CubeBuilder:
+    """
+    Monta o cubo aos poucos, somando o cubo de cada bloco do dataset. Os
+    restaurantes distintos são contados na primeira aparição de cada
+    restaurant_id, guardada em um bitset (1 bit por id), então a memória depende
+    do número de células e da faixa de ids, e não do número de linhas
+    """
+    def __init__(self):
+        self.cube = None
+        self.seen = np.zeros(0, dtype=np.uint8)
+
+    def first_seen(self, ids):
+        """Marca as linhas com um restaurant_id que ainda não apareceu"""
+        ids = np.asarray(ids, dtype=np.int64)
+        first = ~pd.Index(ids).duplicated()
+        if len(ids) == 0:
+            return first
+        byte = ids >> 3
+        bit = np.left_shift(1, ids & 7).astype(np.uint8)
+        if byte.max() >= len(self.seen):
+            size = max(int(byte.max()) + 1, 2 * len(self.seen))
+            self.seen = np.concatenate([self.seen, np.zeros(size - len(self.seen), dtype=np.uint8)])
+        first &= (self.seen[byte] & bit) == 0
+        np.bitwise_or.at(self.seen, byte[first], bit[first])
+        return first
+
+    def add(self, df1):
+        """Soma ao cubo as linhas de um bloco do df1"""
+        part = build_cube(df1, first_seen=self.first_seen(df1['restaurant_id']))
+        if self.cube is not None:
+            part = pd.concat([self.cube, part], ignore_index=True)
+            part = part.groupby(DIMENSIONS, sort=False, observed=True)[MEASURES].sum().reset_index()
+        self.cube = part
+
+    def result(self):
+        """Cubo final, com as dimensões categorizadas como no df1"""
+        return self.cube.astype({dimension: 'category' for dimension in DIMENSIONS})
+
+def update_cube(cube, added, removed):
+    """
+    Atualiza o cubo sem reconstruí-lo: soma as medidas das linhas added e subtrai
+    as das linhas removed (linhas do df1). Cada restaurant_id de removed precisa
+    sair do df1 com todas as suas linhas, como no upsert
+    """
+    parts = [cube.loc[:, DIMENSIONS + MEASURES]]
+    if len(added):
+        parts.append(build_cube(added))
+    if len(removed):
+        delta = build_cube(removed)
+        delta[MEASURES] = -delta[MEASURES]
+        parts.append(delta)
+    # As dimensões voltam a ser texto para que as partes possam ser concatenadas
+    parts = [part.astype({dimension: object for dimension in DIMENSIONS}) for part in parts]
+    cube = pd.concat(parts, ignore_index=True)
+    cube = cube.groupby(DIMENSIONS, sort=False)[MEASURES].sum()
+    cube = cube.loc[cube['restaurants'] > 0, :].reset_index()
+    return cube.astype({dimension: 'category' for dimension in DIMENSIONS})
+
+def load_cube():
+    """Retorna o cubo do dataset atual, construído uma única vez por processo"""
+    return load_derived('cube', build_cube, CUBE_COLUMNS)
+
+def slice_cube(cube, countries=None, cities=None, cuisines=None):
+    """Retorna somente as células dos países, cidades e culinárias selecionados"""
+    lines = np.ones(len(cube), dtype=bool)
+    for dimension, selection in zip(DIMENSIONS, [countries, cities, cuisines]):
+        if selection is not None:
+            lines &= cube[dimension].isin(selection).to_numpy()
+    return cube.loc[lines, :]
+
+def rollup(cube, by):
+    """
+    Soma as medidas do cubo nos grupos de by e calcula as métricas derivadas:
+    médias de nota e de custo e o número de cidades / culinárias distintas
+    """
+    grouped = cube.groupby(by, observed=True)
+    df_aux = grouped[MEASURES].sum()
+    for dimension, name in [('city', 'cities'), ('cuisines', 'n_cuisines')]:
+        if dimension not in by:
+            df_aux[name] = grouped[dimension].nunique()
+    df_aux['rating_mean'] = df_aux['rating_sum'] / df_aux['rating_count']
+    # Média das notas diferentes de zero: as notas zero não alteram a soma
+    df_aux['rating_nonzero_mean'] = df_aux['rating_sum'] / df_aux['rating_nonzero_count'].replace(0, np.nan)
+    df_aux['cost_mean'] = df_aux['cost_sum'] / df_aux['cost_count']
+    return df_aux.reset_index()
+# ====================================================================================
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from utils.data import load_derived
+
+# ====================================================================================
+# Índice invertido culinária -> posições das linhas do df1
+# ====================================================================================
+def member(rows, values):
+    """Máscara dos values que estão em rows (posições ordenadas, como as do índice)"""
+    if len(rows) == 0:
+        return np.zeros(len(values), dtype=bool)
+    found = np.searchsorted(rows, values)
+    return rows[np.minimum(found, len(rows) - 1)] == values
+
+class CuisineIndex:
+    """
+    Índice invertido com todas as culinárias que cada restaurante lista. As posições
+    das linhas de todas as culinárias ficam em um único array; as posições da
+    culinária i são positions[offsets[i]:offsets[i + 1]], em ordem crescente
+    """
+    def __init__(self, all_cuisines):
+        self.n_rows = len(all_cuisines)
+        # Cada combinação distinta de culinárias é separada uma única vez
+        combos = pd.Categorical(all_cuisines).remove_unused_categories()
+        codes = np.asarray(combos.codes)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(combos.categories) + 1))
+        rows_by_cuisine = {}
+        for code, combo in enumerate(combos.categories):
+            rows = order[bounds[code]:bounds[code + 1]]
+            for cuisine in combo.split(','):
+                if cuisine.strip():
+                    rows_by_cuisine.setdefault(cuisine.strip(), []).append(rows)
+        self.cuisines = pd.Index(sorted(rows_by_cuisine))
+        arrays = [np.sort(np.concatenate(rows_by_cuisine[cuisine])) for cuisine in self.cuisines]
+        self.offsets = np.concatenate([[0], np.cumsum([len(rows) for rows in arrays])])
+        self.positions = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.intp)
+
+    def rows(self, cuisine):
+        """Posições (ordenadas) das linhas dos restaurantes que listam a culinária"""
+        i = self.cuisines.get_loc(cuisine)
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def aggregate(self, values, where=None):
+        """
+        Soma e contagem de values (um array alinhado ao df1) por culinária,
+        considerando somente as linhas em que where é True
+        """
+        values = np.asarray(values, dtype='float64')
+        if where is None:
+            where = np.ones(self.n_rows, dtype=bool)
+        selected = np.asarray(where, dtype=bool)[self.positions]
+        # Toda culinária do índice tem ao menos uma linha, então nenhuma fatia é vazia
+        sums = np.add.reduceat(np.where(selected, values[self.positions], 0.0), self.offsets[:-1])
+        counts = np.add.reduceat(selected.astype('int64'), self.offsets[:-1])
+        return pd.DataFrame({'cuisines': self.cuisines, 'sum': sums, 'count': counts})
+
+def load_cuisine_index():
+    """Retorna o índice de culinárias do dataset atual, construído uma única vez por processo"""
+    return load_derived('cuisine_index', lambda df1: CuisineIndex(df1['all_cuisines']), ['all_cuisines'])
+# ====================================================================================
@@ -0,0 +1,119 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.paths import CURRENCIES_PATH
+
+# ====================================================================================
+# Conversão de moedas vetorizada
+# ====================================================================================
+def read_rates(currencies_path=CURRENCIES_PATH):
+    """
+    Lê o csv de cotações (mesmo formato do BCE usado pelo CurrencyConverter, com
+    uma ou várias datas) e retorna um dataframe indexado pela data, com uma
+    coluna por moeda (base EUR)
+    """
+    # round_trip: o mesmo float que o float() do Python (e do CurrencyConverter) produz
+    rates = pd.read_csv(currencies_path, skipinitialspace=True, na_values=['N/A'], float_precision='round_trip')
+    rates.columns = [col.strip() for col in rates.columns]
+    rates = rates.dropna(axis=1, how='all')
+    try:
+        rates['Date'] = pd.to_datetime(rates['Date'], format='%d %B %Y')
+    except ValueError:
+        # Arquivo histórico do BCE: datas no formato 2023-03-17
+        rates['Date'] = pd.to_datetime(rates['Date'], format='ISO8601')
+    rates = rates.set_index('Date').sort_index().astype('float64')
+    # Assim como no CurrencyConverter, o EUR é a moeda de referência
+    rates['EUR'] = 1.0
+    return rates
+
+class VectorConverter:
+    """
+    Equivalente vetorizado do CurrencyConverter.convert: guarda a tabela de
+    cotações como um array (datas x moedas) e converte colunas inteiras com
+    operações do NumPy. Sem data, usa a cotação mais recente de cada moeda; com
+    data, a cotação mais recente até aquela data (junção "as-of")
+    """
+    def __init__(self, currencies_path=CURRENCIES_PATH):
+        # Dias sem cotação de uma moeda repetem a cotação anterior
+        rates = read_rates(currencies_path).ffill()
+        self.currencies = pd.Index(rates.columns)
+        self.dates = rates.index.to_numpy(dtype='datetime64[ns]')
+        self.table = rates.to_numpy(dtype='float64')
+        # Cotação mais recente de cada moeda (igual ao convert sem data)
+        self.rates = self.table[-1]
+
+    def currency_positions(self, currencies):
+        """Retorna os códigos (factorize) da sequência e a coluna da tabela de cada código"""
+        if not isinstance(currencies, (pd.Series, pd.Index, pd.Categorical, np.ndarray)):
+            currencies = np.asarray(currencies, dtype=object)
+        codes, uniques = pd.factorize(currencies)
+        positions = self.currencies.get_indexer(uniques)
+        if (positions < 0).any():
+            unknown = list(uniques[positions < 0])
+            raise ValueError(f"{unknown} is not a supported currency")
+        if (codes < 0).any():
+            raise ValueError("None is not a supported currency")
+        return codes, positions
+
+    def date_rows(self, dates):
+        """
+        Linha da tabela de cotações de cada data: a última data de cotação até
+        ela. Datas nulas usam a cotação mais recente
+        """
+        # As datas distintas são poucas: a busca binária é feita só nelas
+        codes, uniques = pd.factorize(pd.to_datetime(np.asarray(dates)))
+        values = uniques.to_numpy(dtype='datetime64[ns]')
+        rows = np.searchsorted(self.dates, values, side='right') - 1
+        if (rows < 0).any():
+            first = pd.Timestamp(self.dates[0]).date()
+            raise ValueError(f"{list(uniques[rows < 0].date)} is before the first rate date ({first})")
+        rows = np.append(rows, len(self.dates) - 1)
+        return rows[codes]
+
+    def rate_vector(self, currencies, dates=None):
+        """Retorna a cotação (base EUR) de cada moeda da sequência informada, na data de cada uma"""
+        codes, positions = self.currency_positions(currencies)
+        if dates is None:
+            return self.rates[positions][codes]
+        rates = self.table[self.date_rows(dates), positions[codes]]
+        if np.isnan(rates).any():
+            missing = sorted(set(self.currencies[positions[codes][np.isnan(rates)]]))
+            raise ValueError(f"{missing} has no rate on or before the given date")
+        return rates
+
+    def convert(self, amount, currency, new_currency='USD', date=None):
+        """
+        Converte os valores de amount da(s) moeda(s) currency para new_currency.
+        currency pode ser um único código ou uma sequência do mesmo tamanho de
+        amount, e date uma única data ou uma sequência de datas (uma por valor)
+        """
+        amount = np.asarray(amount, dtype='float64')
+        if date is not None and np.ndim(date) == 0:
+            date = np.full(len(amount) if amount.ndim else 1, pd.Timestamp(date), dtype='datetime64[ns]')
+        if isinstance(currency, str):
+            currency = np.full(len(date) if date is not None else 1, currency, dtype=object)
+        r0 = self.rate_vector(currency, date)
+        r1 = self.rate_vector(np.full(len(r0), new_currency, dtype=object), date)
+        if amount.ndim == 0:
+            r0, r1 = r0[0], r1[0]
+        # Mesma ordem de operações do CurrencyConverter para obter o mesmo resultado
+        return amount / r0 * r1
+
+# Conversores já montados, por arquivo de cotações: a tabela é lida uma única vez
+# por processo (e de novo só quando o arquivo muda)
+_CONVERTERS = {}
+_CONVERTERS_LOCK = threading.Lock()
+
+def load_converter(currencies_path=CURRENCIES_PATH):
+    """Retorna o VectorConverter do arquivo de cotações, guardado em memória"""
+    stat = os.stat(currencies_path)
+    key = (os.path.abspath(currencies_path), stat.st_mtime_ns, stat.st_size)
+    with _CONVERTERS_LOCK:
+        if key not in _CONVERTERS:
+            _CONVERTERS.clear()
+            _CONVERTERS[key] = VectorConverter(currencies_path)
+        return _CONVERTERS[key]
+# ====================================================================================
@@ -0,0 +1,861 @@
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import inflection
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.currency import load_converter
+from utils.paths import ZOMATO_PATH, CURRENCIES_PATH
+from utils.tracing import span
+
+# ====================================================================================
+# Dicionários de apoio
+# ====================================================================================
+# Código da moeda a partir da coluna currency. O dataset usa o mesmo rótulo
+# "Dollar($)" para todas as moedas em dólar; ele é tratado como USD.
+CURRENCY = {
+    "Indian Rupees(Rs.)": "INR",
+    "Brazilian Real(R$)": "BRL",
+    "Indonesian Rupiah(IDR)": "IDR",
+    "NewZealand($)": "NZD",
+    "Botswana Pula(P)": "PHP",
+    "Qatari Rial(QR)": "QAR",
+    "Rand(R)": "ZAR",
+    "Sri Lankan Rupee(LKR)": "LKR",
+    "Turkish Lira(TL)": "TRY",
+    "Emirati Diram(AED)": "AED",
+    "Pounds(£)": "GBP",
+    "Dollar($)": "USD"
+}
+
+# Código do país -> nome do país
+COUNTRY = {
+    1: "India",
+    14: "Australia",
+    30: "Brazil",
+    37: "Canada",
+    94: "Indonesia",
+    148: "New Zeland",
+    162: "Philippines",
+    166: "Qatar",
+    184: "Singapure",
+    189: "South Africa",
+    191: "Sri Lanka",
+    208: "Turkey",
+    214: "United Arab Emirates",
+    215: "England",
+    216: "United States of America"
+}
+# ====================================================================================
+
+# ====================================================================================
+# Defining functions
+# ====================================================================================
+# Faz cópia do dataframe original e altera os nomes das colunas, tirando o espaço e colocando underline
+def rename_columns(dataframe):
+    df = dataframe.copy()
+    title = lambda x: inflection.titleize(x)
+    snakecase = lambda x: inflection.underscore(x)
+    spaces = lambda x: x.replace(" ", "")
+    cols_old = list(df.columns)
+    cols_old = list(map(title, cols_old))
+    cols_old = list(map(spaces, cols_old))
+    cols_new = list(map(snakecase, cols_old))
+    df.columns = cols_new
+    return df
+
+def currency_code(currency):
+    """
+    Retorna o código da moeda baseado na informação da coluna currency
+    """
+    return CURRENCY[currency]
+
+def country_name(country_ID):
+    """Função que recebe o ID do país e retorna seu nome"""
+    return COUNTRY[country_ID]
+
+def map_column(series, mapping):
+    """
+    Versão vetorizada das funções acima: busca no dicionário só os valores
+    distintos da coluna e espalha o resultado com os códigos do factorize.
+    Levanta KeyError, como a busca no dicionário, se algum valor não for conhecido
+    """
+    codes, uniques = pd.factorize(series)
+    missing = [value for value in uniques if value not in mapping]
+    if missing:
+        raise KeyError(missing)
+    # O último elemento (NaN) recebe os valores nulos, que têm código -1
+    values = np.array([mapping[value] for value in uniques] + [np.nan], dtype=object)
+    return pd.Series(values[codes], index=series.index, name=series.name)
+
+def clean_data(df, currencies_path=CURRENCIES_PATH):
+    """Aplica a limpeza e o enriquecimento do dataset bruto e retorna o df1"""
+    return compact_dtypes(clean_rows(df, load_converter(currencies_path)))
+
+# Coluna opcional com a data de cada registro: o custo é convertido com a cotação
+# dessa data (a mais recente até ela), e não com a última cotação do arquivo
+DATE_COLUMN = 'date'
+
+def clean_rows(df, converter):
+    """
+    Limpeza e enriquecimento que dependem só de cada linha (sem os tipos
+    compactos), por isso também podem ser aplicados a cada bloco do csv
+    """
+    df1 = rename_columns(df)
+    # Uma data vazia não descarta o registro: ele usa a cotação mais recente
+    df1 = df1.dropna(subset=[col for col in df1.columns if col != DATE_COLUMN])
+    # Guarda a lista completa de culinárias (usada pelo índice de culinárias) e
+    # categoriza os restaurantes somente pelo primeiro tipo de cuisines
+    df1['all_cuisines'] = df1.loc[:, 'cuisines']
+    df1['cuisines'] = df1.loc[:, 'cuisines'].apply(lambda x: x.split(',')[0])
+
+    # Insere colunas com o código da moeda e com o custo do prato para dois em USD
+    df1['currency_code'] = map_column(df1['currency'], CURRENCY)
+    dates = None
+    if DATE_COLUMN in df1.columns:
+        df1[DATE_COLUMN] = pd.to_datetime(df1[DATE_COLUMN])
+        dates = df1[DATE_COLUMN]
+    df1['average_cost_for_two_us_dollar'] = converter.convert(df1['average_cost_for_two'], df1['currency_code'], 'USD', dates)
+
+    # Remove a linha com valor average_cost_for_two = 25000017
+    lines = df1['restaurant_name'] == "d'Arry's Verandah Restaurant"
+    df1.drop(df1.index[lines.values], inplace=True)
+
+    # Cria coluna com o nome dos países
+    df1['country_name'] = map_column(df1['country_code'], COUNTRY)
+    return df1
+
+# Tipos compactos do df1: textos com poucos valores distintos viram categorias (os
+# filtros e groupbys passam a trabalhar com os códigos inteiros), flags viram bool
+# e notas e custos ficam em float32
+CATEGORY_COLUMNS = ['country_name', 'city', 'locality', 'cuisines', 'all_cuisines', 'currency',
+                    'currency_code', 'rating_color', 'rating_text']
+FLAG_COLUMNS = ['has_table_booking', 'has_online_delivery', 'is_delivering_now', 'switch_to_order_menu']
+FLOAT32_COLUMNS = ['aggregate_rating', 'average_cost_for_two_us_dollar']
+INTEGER_COLUMNS = ['restaurant_id', 'country_code', 'average_cost_for_two', 'price_range', 'votes']
+
+def compact_dtypes(df1):
+    """Converte as colunas do df1 para os tipos compactos acima"""
+    dtypes = {}
+    reordered = {}
+    for col in df1.columns:
+        if col in CATEGORY_COLUMNS:
+            # As categorias ficam em ordem alfabética, como no astype('category'),
+            # também quando a coluna já chega categorizada (snapshot em blocos). O
+            # astype para as mesmas categorias em outra ordem não muda nada: a ordem
+            # é trocada com reorder_categories
+            if isinstance(df1[col].dtype, pd.CategoricalDtype):
+                categories = df1[col].cat.categories
+                if not categories.is_monotonic_increasing:
+                    reordered[col] = df1[col].cat.reorder_categories(categories.sort_values())
+            else:
+                dtypes[col] = 'category'
+        elif col in FLAG_COLUMNS:
+            dtypes[col] = 'bool'
+        elif col in FLOAT32_COLUMNS:
+            dtypes[col] = 'float32'
+        elif col in INTEGER_COLUMNS:
+            # Menor inteiro que comporta os valores da coluna
+            dtypes[col] = pd.to_numeric(df1[col], downcast='integer').dtype
+    if reordered:
+        df1 = df1.assign(**reordered)
+    return df1.astype(dtypes)
+# ====================================================================================
+
+# ====================================================================================
+# Snapshot colunar (Parquet) do dataset limpo
+# ====================================================================================
+# Colunas de texto livre do csv que nenhuma página usa e que nem chegam a ser lidas
+UNUSED_COLUMNS = ['Address', 'Locality Verbose']
+
+# Colunas de texto do csv. Lidas sempre como texto, para que um bloco em que só
+# aparecem números (uma cor '000000', por exemplo) não mude o tipo da coluna
+TEXT_COLUMNS = ['Restaurant Name', 'City', 'Locality', 'Cuisines', 'Currency', 'Rating color', 'Rating text']
+
+# Arquivos a partir desse tamanho são limpos em blocos de CHUNK_SIZE linhas
+STREAM_MIN_BYTES = 256 * 2**20
+CHUNK_SIZE = 500_000
+
+# Versão do formato do snapshot: incremente quando a limpeza ou os tipos do df1
+# mudarem, para que os snapshots antigos sejam reconstruídos
+SNAPSHOT_VERSION = 5
+
+def is_sharded(zomato_path=ZOMATO_PATH):
+    """
+    A origem é uma pasta ou um padrão glob com vários arquivos csv. Um arquivo que
+    existe com '[' ou '*' no nome continua sendo um único csv
+    """
+    if os.path.isdir(zomato_path):
+        return True
+    return glob.has_magic(zomato_path) and not os.path.exists(zomato_path)
+
+def glob_root(pattern):
+    """Pasta do padrão glob até o primeiro componente com curinga"""
+    literal = []
+    for part in os.path.dirname(pattern).split(os.sep):
+        if glob.has_magic(part):
+            break
+        literal.append(part)
+    root = os.sep.join(literal)
+    if not root:
+        return os.sep if pattern.startswith(os.sep) else os.curdir
+    return root
+
+def source_files(zomato_path=ZOMATO_PATH):
+    """
+    Arquivos csv de origem, em ordem: o próprio arquivo, todos os .csv da pasta
+    ou os arquivos do padrão glob
+    """
+    if not is_sharded(zomato_path):
+        return [zomato_path]
+    pattern = os.path.join(glob.escape(zomato_path), '*.csv') if os.path.isdir(zomato_path) else zomato_path
+    files = sorted(glob.glob(pattern))
+    if not files:
+        raise FileNotFoundError(f'Nenhum arquivo csv em {zomato_path}')
+    return files
+
+def snapshot_base(zomato_path=ZOMATO_PATH):
+    """Caminho (sem extensão) dos arquivos gerados a partir da origem"""
+    if os.path.isdir(zomato_path):
+        return os.path.join(zomato_path, 'zomato_shards')
+    if is_sharded(zomato_path):
+        # Os arquivos gerados ficam na parte literal do padrão (dataset/*/zomato_*.csv
+        # grava em dataset/), nunca em um caminho com o curinga
+        return os.path.join(glob_root(zomato_path), 'zomato_shards')
+    return os.path.splitext(zomato_path)[0]
+
+def snapshot_path(zomato_path=ZOMATO_PATH):
+    """Caminho do snapshot Parquet gerado a partir do csv"""
+    return snapshot_base(zomato_path) + '.parquet'
+
+def delta_dir(zomato_path=ZOMATO_PATH):
+    """Pasta com as atualizações incrementais (utils.upsert) já aplicadas ao snapshot"""
+    return snapshot_base(zomato_path) + '.deltas'
+
+def delta_files(zomato_path=ZOMATO_PATH):
+    """Atualizações incrementais, na ordem em que foram aplicadas"""
+    return sorted(glob.glob(os.path.join(glob.escape(delta_dir(zomato_path)), '*.csv')))
+
+def input_files(zomato_path=ZOMATO_PATH):
+    """Todos os arquivos que definem o dataset: os csv de origem e as atualizações"""
+    return source_files(zomato_path) + delta_files(zomato_path)
+
+def delta_snapshot(delta_path):
+    """Parte do snapshot com as linhas limpas de um arquivo de atualização"""
+    return os.path.splitext(delta_path)[0] + '.parquet'
+
+def snapshot_files(zomato_path=ZOMATO_PATH):
+    """Partes do snapshot, em ordem: a base (snapshot_path) e uma parte por atualização"""
+    return [snapshot_path(zomato_path)] + [delta_snapshot(path) for path in delta_files(zomato_path)]
+
+def update_digest(digest, path):
+    """Soma o conteúdo do arquivo ao hash"""
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+
+def source_hash(*paths):
+    """Hash sha256 do conteúdo dos arquivos de origem e da versão do snapshot"""
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    for path in paths:
+        update_digest(digest, path)
+    return digest.hexdigest()
+
+def source_hashes(files, deltas, currencies_path=CURRENCIES_PATH):
+    """
+    Hash de cada parte do snapshot: o da base, source_hash(*files, currencies_path),
+    e o de cada atualização, que cobre também a base e as atualizações anteriores.
+    O último é o hash do dataset inteiro, source_hash(*files, *deltas, currencies_path)
+    """
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    hashes = []
+    for i, path in enumerate(files + deltas):
+        update_digest(digest, path)
+        if i >= len(files) - 1:
+            # O arquivo de câmbio entra por último, como no source_hash
+            part = digest.copy()
+            update_digest(part, currencies_path)
+            hashes.append(part.hexdigest())
+    return hashes
+
+def derived_path(name, zomato_path=ZOMATO_PATH):
+    """Caminho de uma estrutura derivada (o cubo, por exemplo) gravada junto com o snapshot"""
+    return snapshot_base(zomato_path) + f'.{name}.parquet'
+
+def read_raw(zomato_path=ZOMATO_PATH, chunksize=None):
+    """
+    Lê o csv bruto, sem as colunas de texto livre que não são usadas. Com
+    chunksize, retorna um iterador de blocos
+    """
+    return pd.read_csv(zomato_path, usecols=lambda col: col not in UNUSED_COLUMNS,
+                       dtype={col: str for col in TEXT_COLUMNS}, chunksize=chunksize)
+
+def snapshot_hash(path):
+    """Retorna o hash de origem gravado no snapshot, ou None se ele não existir"""
+    if not os.path.exists(path):
+        return None
+    metadata = pq.read_schema(path).metadata or {}
+    value = metadata.get(b'source_hash')
+    return value.decode() if value else None
+
+def build_snapshot(zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH, content_hash=None, chunk_size=None):
+    """
+    Limpa o csv e grava o resultado como Parquet, com o hash dos arquivos de
+    origem nos metadados. Retorna o caminho do snapshot. Arquivos grandes (ou
+    com chunk_size informado) são processados em blocos por stream_snapshot.
+    As atualizações incrementais não entram na base: cada uma é uma parte
+    separada do snapshot (write_delta_snapshot)
+    """
+    if content_hash is None:
+        content_hash = source_hash(*source_files(zomato_path), currencies_path)
+    if is_sharded(zomato_path):
+        return shards_snapshot(zomato_path, currencies_path, content_hash)
+    if chunk_size is None and os.path.getsize(zomato_path) >= STREAM_MIN_BYTES:
+        chunk_size = CHUNK_SIZE
+    if chunk_size:
+        return stream_snapshot(zomato_path, currencies_path, content_hash, chunk_size)
+    with span('load.read_csv'):
+        df = read_raw(zomato_path)
+    with span('clean'):
+        df1 = clean_data(df, currencies_path)
+    path = snapshot_path(zomato_path)
+    with span('load.write_snapshot'):
+        write_table(df1, path, content_hash)
+    return path
+
+def compact_rows(df1):
+    """Tipos compactos que não dependem do dataset inteiro: notas, custos e flags"""
+    return df1.astype({**{col: 'float32' for col in FLOAT32_COLUMNS},
+                       **{col: 'bool' for col in FLAG_COLUMNS}})
+
+def stream_schema(df1, content_hash=None, index=False):
+    """
+    Schema fixo dos blocos do snapshot: as categorias viram colunas de dicionário
+    e os inteiros ficam com 64 bits (o load_data reduz os tipos na leitura). Com
+    index, os rótulos das linhas são gravados como no build_snapshot
+    """
+    schema = pa.Schema.from_pandas(df1, preserve_index=index)
+    fields = []
+    for field in schema:
+        if field.name in CATEGORY_COLUMNS:
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        elif field.name in INTEGER_COLUMNS or field.name.startswith('__index_level_'):
+            field = field.with_type(pa.int64())
+        fields.append(field)
+    # Os metadados do pandas dizem ao read_parquet qual coluna é o índice
+    metadata = dict(schema.metadata or {}) if index else {}
+    if content_hash:
+        metadata[b'source_hash'] = content_hash.encode()
+    return pa.schema(fields, metadata=metadata or None)
+
+def write_table(df, path, content_hash):
+    """
+    Grava o dataframe (ou a tabela Arrow) como Parquet com o hash de origem nos
+    metadados. Grava em um arquivo temporário e troca de uma vez, para que outro
+    processo nunca leia um arquivo pela metade
+    """
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'source_hash': content_hash.encode()})
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+def stream_snapshot(zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH, content_hash=None, chunk_size=CHUNK_SIZE):
+    """
+    Versão em blocos do build_snapshot para um csv grande: cada bloco é limpo,
+    gravado como um row group do snapshot e somado ao cubo de agregados, que
+    também é gravado (derived_path('cube')). A memória usada depende do tamanho
+    do bloco, e não do tamanho do arquivo
+    """
+    from utils.cube import CubeBuilder
+    if content_hash is None:
+        content_hash = source_hash(zomato_path, currencies_path)
+    converter = load_converter(currencies_path)
+    cube = CubeBuilder()
+    path = snapshot_path(zomato_path)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    writer = None
+    try:
+        for df in read_raw(zomato_path, chunksize=chunk_size):
+            with span('clean'):
+                df1 = compact_rows(clean_rows(df, converter))
+            if df1.empty:
+                continue
+            if writer is None:
+                schema = stream_schema(df1, content_hash, index=True)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            with span('load.write_snapshot'):
+                # Os blocos do read_csv continuam a numeração das linhas do arquivo: os
+                # rótulos ficam iguais aos do build_snapshot, com as mesmas lacunas das
+                # linhas descartadas
+                writer.write_table(pa.Table.from_pandas(df1, schema=schema, preserve_index=True))
+            with span('aggregate.cube'):
+                cube.add(df1)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError(f'{zomato_path} não tem nenhuma linha válida')
+    write_table(cube.result(), derived_path('cube', zomato_path), content_hash)
+    os.replace(tmp_path, path)
+    return path
+
+def clean_shard(path, currencies_path=CURRENCIES_PATH):
+    """
+    Lê e limpa um dos arquivos de origem (executada nos processos do pool).
+    Retorna uma tabela Arrow com o schema fixo, ou None se não sobrar nenhuma linha
+    """
+    df1 = compact_rows(clean_rows(read_raw(path), load_converter(currencies_path)))
+    if df1.empty:
+        return None
+    return pa.Table.from_pandas(df1, schema=stream_schema(df1), preserve_index=False)
+
+def shards_snapshot(zomato_path, currencies_path=CURRENCIES_PATH, content_hash=None, max_workers=None):
+    """
+    Versão do build_snapshot para vários arquivos de origem: cada arquivo é lido e
+    limpo em um processo do pool, e os resultados são unidos em um único snapshot.
+    Um restaurant_id que aparece em mais de um arquivo fica só com as linhas do
+    primeiro deles (em ordem alfabética)
+    """
+    files = source_files(zomato_path)
+    if content_hash is None:
+        content_hash = source_hash(*files, currencies_path)
+    max_workers = min(len(files), max_workers or os.cpu_count() or 1)
+    with span('clean'):
+        if max_workers > 1:
+            # spawn: o processo do Streamlit tem várias threads, e o fork copiaria locks em uso
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers, mp_context=context) as pool:
+                tables = list(pool.map(clean_shard, files, [currencies_path] * len(files)))
+        else:
+            tables = [clean_shard(path, currencies_path) for path in files]
+    tables = [table for table in tables if table is not None]
+    if not tables:
+        raise ValueError(f'{zomato_path} não tem nenhuma linha válida')
+    with span('aggregate.dedup'):
+        seen = np.empty(0, dtype=np.int64)
+        for i, table in enumerate(tables):
+            ids = table.column('restaurant_id').to_numpy()
+            if i > 0:
+                tables[i] = table.filter(~np.isin(ids, seen))
+            seen = np.union1d(seen, ids)
+    path = snapshot_path(zomato_path)
+    with span('load.write_snapshot'):
+        write_table(pa.concat_tables(tables), path, content_hash)
+    return path
+
+# ====================================================================================
+# Partes do snapshot com as atualizações incrementais
+# ====================================================================================
+# Cada arquivo de atualização (utils.upsert) é limpo e gravado como uma parte
+# separada do snapshot, ao lado do csv em delta_dir(), sem regravar a base. Um
+# restaurant_id de uma parte substitui as linhas desse id de todas as partes
+# anteriores: essas linhas são descartadas na leitura. As linhas novas recebem
+# rótulos depois dos rótulos das partes anteriores, e as demais mantêm os seus.
+def replaced_ids(files):
+    """restaurant_id substituídos por partes seguintes: um array por parte (vazio na última)"""
+    later = np.empty(0, dtype=np.int64)
+    replaced = [later]
+    for path in reversed(files[1:]):
+        ids = pq.read_table(path, columns=['restaurant_id'])['restaurant_id'].to_numpy()
+        later = np.union1d(later, ids.astype(np.int64))
+        replaced.append(later)
+    return replaced[::-1]
+
+def next_label(files):
+    """Primeiro rótulo depois dos rótulos de todas as linhas das partes, inclusive as substituídas"""
+    label = 0
+    for path in files:
+        parquet = pq.ParquetFile(path)
+        if '__index_level_0__' in parquet.schema_arrow.names:
+            high = pc.max(parquet.read(columns=['__index_level_0__']).column(0)).as_py()
+            label = max(label, -1 if high is None else high + 1)
+        else:
+            # Sem a coluna, os rótulos são as posições das linhas (RangeIndex)
+            label = max(label, parquet.metadata.num_rows)
+    return label
+
+def write_delta_snapshot(delta, path, files, content_hash):
+    """
+    Grava o arquivo de atualização já limpo (delta) como a parte do snapshot
+    seguinte às partes files. Retorna delta com os rótulos das linhas novas
+    """
+    start = next_label(files)
+    delta = delta.set_axis(pd.Index(np.arange(start, start + len(delta), dtype=np.int64)))
+    with span('load.write_snapshot'):
+        write_table(delta, path, content_hash)
+    return delta
+
+def read_snapshot(files, columns=None, restaurant_ids=None):
+    """
+    Lê as colunas das partes do snapshot, em ordem e sem as linhas substituídas,
+    com os tipos do clean_data. Com restaurant_ids, só as linhas desses restaurantes
+    """
+    filters = None if restaurant_ids is None else [('restaurant_id', 'in', [int(i) for i in restaurant_ids])]
+    if len(files) == 1:
+        # O snapshot em blocos guarda os inteiros em 64 bits e as categorias na
+        # ordem de aparição; compact_dtypes deixa os tipos iguais aos do clean_data
+        return compact_dtypes(pd.read_parquet(files[0], columns=columns, filters=filters))
+    parts = []
+    for path, replaced in zip(files, replaced_ids(files)):
+        read = columns if columns is None or 'restaurant_id' in columns else columns + ['restaurant_id']
+        df_aux = pd.read_parquet(path, columns=read, filters=filters)
+        keep = ~df_aux['restaurant_id'].isin(replaced).to_numpy()
+        parts.append(df_aux.loc[keep, columns if columns is not None else df_aux.columns])
+    # As categorias ficam só com os valores das linhas lidas, iguais em todas as
+    # partes, para que o concat não transforme as colunas em texto
+    categories = {}
+    for col in parts[0].select_dtypes('category').columns:
+        values = [part[col].cat.remove_unused_categories().cat.categories for part in parts]
+        categories[col] = pd.CategoricalDtype(values[0].append(values[1:]).unique().sort_values())
+    return compact_dtypes(pd.concat([part.astype(categories) for part in parts]))
+
+def snapshot_batches(files, columns, chunk_size=CHUNK_SIZE):
+    """
+    Lê as colunas das partes do snapshot bloco a bloco, em ordem e sem as linhas
+    substituídas. Uma parte sem __index_level_0__ recebe as posições das linhas
+    como rótulos, quando a coluna é pedida
+    """
+    for path, replaced in zip(files, replaced_ids(files)):
+        parquet = pq.ParquetFile(path)
+        names = parquet.schema_arrow.names
+        read = [col for col in columns if col in names]
+        if len(replaced) and 'restaurant_id' not in read:
+            read.append('restaurant_id')
+        offset = 0
+        for batch in parquet.iter_batches(batch_size=chunk_size, columns=read):
+            if '__index_level_0__' in columns and '__index_level_0__' not in names:
+                labels = pa.array(np.arange(offset, offset + batch.num_rows, dtype=np.int64))
+                batch = batch.append_column('__index_level_0__', labels)
+            offset += batch.num_rows
+            if len(replaced):
+                batch = batch.filter(pc.invert(pc.is_in(batch.column('restaurant_id'),
+                                                        pa.array(replaced).cast(batch.schema.field('restaurant_id').type))))
+            yield batch.select(columns)
+
+def ensure_snapshot(zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH):
+    """
+    Reconstrói as partes do snapshot cujos arquivos de origem mudaram. Retorna a
+    lista das partes (snapshot_files)
+    """
+    deltas = delta_files(zomato_path)
+    hashes = source_hashes(source_files(zomato_path), deltas, currencies_path)
+    files = [snapshot_path(zomato_path)]
+    if snapshot_hash(files[0]) != hashes[0]:
+        build_snapshot(zomato_path, currencies_path, hashes[0])
+    for delta_path, content_hash in zip(deltas, hashes[1:]):
+        path = delta_snapshot(delta_path)
+        # O hash de cada parte cobre as anteriores: uma base nova regrava todas as partes
+        if snapshot_hash(path) != content_hash:
+            with span('clean'):
+                delta = clean_data(read_raw(delta_path), currencies_path)
+            write_delta_snapshot(delta, path, files, content_hash)
+        files.append(path)
+    if mmap_enabled():
+        ensure_mmap(files, hashes[-1], zomato_path)
+    return files
+# ====================================================================================
+
+# ====================================================================================
+# Colunas do df1 mapeadas em memória
+# ====================================================================================
+# O Parquet é comprimido: cada processo do servidor que o lê guarda a sua própria
+# cópia descompactada das colunas. Na construção do snapshot, as colunas numéricas
+# e os códigos das categorias também são gravados em arquivos .npy, já com os tipos
+# compactos e sem compressão, e são abertos com mmap: o df1 aponta direto para as
+# páginas dos arquivos, somente leitura, que o sistema operacional compartilha
+# entre todos os processos. Só os textos livres continuam vindo do Parquet. Os
+# arquivos são gravados junto com o snapshot (ensure_snapshot e python -m
+# utils.data), bloco a bloco: a memória usada depende do tamanho dos blocos e dos
+# row groups do snapshot, e não do tamanho do dataset. Com ZOMATO_MMAP=0, todas as
+# colunas são lidas do Parquet.
+MMAP_ENV = 'ZOMATO_MMAP'
+
+# Arquivo com a lista das colunas, os tipos e as categorias de cada versão
+MMAP_MANIFEST = 'manifest.json'
+
+def mmap_enabled():
+    """As colunas do df1 vêm dos arquivos mapeados em memória (padrão), e não do Parquet"""
+    return os.environ.get(MMAP_ENV, '') != '0'
+
+def mmap_dir(content_hash, zomato_path=ZOMATO_PATH):
+    """Pasta com as colunas mapeadas da versão content_hash do dataset"""
+    return os.path.join(snapshot_base(zomato_path) + '.mmap', content_hash)
+
+def mmap_kind(field):
+    """Como a coluna é guardada: códigos e categorias, array numérico ou só no Parquet"""
+    if field.name in CATEGORY_COLUMNS:
+        return 'category'
+    if pa.types.is_integer(field.type) or pa.types.is_floating(field.type) or pa.types.is_boolean(field.type):
+        return 'array'
+    return 'parquet'
+
+def mmap_layout(files, chunk_size=CHUNK_SIZE):
+    """
+    Primeira leitura das partes do snapshot, bloco a bloco: as categorias de cada
+    coluna (em ordem alfabética, como no compact_dtypes) e o menor tipo inteiro
+    que comporta cada coluna de INTEGER_COLUMNS
+    """
+    schema = pq.read_schema(files[0])
+    kinds = {field.name: mmap_kind(field) for field in schema
+             if not field.name.startswith('__index_level_')}
+    categories = {name: set() for name, kind in kinds.items() if kind == 'category'}
+    bounds = {}
+    rows = 0
+    columns = list(categories) + [col for col in INTEGER_COLUMNS if col in kinds]
+    for batch in snapshot_batches(files, columns, chunk_size):
+        rows += batch.num_rows
+        for name in batch.schema.names:
+            column = batch.column(name)
+            if name in categories:
+                # O dicionário inteiro, como na leitura do Parquet pelo pandas; com
+                # atualizações, só os valores das linhas lidas, como no read_snapshot
+                if pa.types.is_dictionary(column.type) and len(files) == 1:
+                    values = column.dictionary
+                else:
+                    values = column.unique()
+                categories[name].update(value for value in values.to_pylist() if value is not None)
+            elif kinds.get(name) == 'array' and len(column) > 0:
+                low, high = pc.min_max(column).values()
+                previous = bounds.get(name, (low.as_py(), high.as_py()))
+                bounds[name] = (min(previous[0], low.as_py()), max(previous[1], high.as_py()))
+    integers = {name: str(pd.to_numeric(pd.Series(list(bound)), downcast='integer').dtype)
+                for name, bound in bounds.items()}
+    return {
+        'rows': rows,
+        'index': len(files) > 1 or '__index_level_0__' in schema.names,
+        'kinds': kinds,
+        'categories': {name: sorted(values) for name, values in categories.items()},
+        'integers': integers,
+    }
+
+def write_mmap(files, content_hash, zomato_path=ZOMATO_PATH, chunk_size=CHUNK_SIZE, prune=True):
+    """
+    Grava as colunas das partes do snapshot em arquivos .npy, bloco a bloco. Grava
+    em uma pasta temporária e a renomeia de uma vez. Com prune, as versões antigas
+    são apagadas (prune_mmap)
+    """
+    layout = mmap_layout(files, chunk_size)
+    directory = mmap_dir(content_hash, zomato_path)
+    tmp_dir = f'{directory}.{os.getpid()}.tmp'
+    os.makedirs(tmp_dir, exist_ok=True)
+    dtypes = {name: pd.CategoricalDtype(pd.Index(values, dtype=object))
+              for name, values in layout['categories'].items()}
+    # Cada arquivo é escrito em sequência, bloco após bloco, com o cabeçalho do .npy
+    outputs = {}
+    def store(name, values):
+        if name not in outputs:
+            outputs[name] = open(os.path.join(tmp_dir, f'{name}.npy'), 'wb')
+            np.lib.format.write_array_header_1_0(outputs[name], {
+                'descr': np.lib.format.dtype_to_descr(values.dtype), 'fortran_order': False,
+                'shape': (layout['rows'],)})
+        outputs[name].write(np.ascontiguousarray(values).tobytes())
+    columns = [name for name, kind in layout['kinds'].items() if kind != 'parquet']
+    if layout['index']:
+        columns.append('__index_level_0__')
+    for batch in snapshot_batches(files, columns, chunk_size):
+        for name in batch.schema.names:
+            column = batch.column(name)
+            if name in dtypes:
+                values = pd.Categorical(column.to_pandas(), dtype=dtypes[name]).codes
+            elif name in layout['integers']:
+                values = column.to_numpy().astype(layout['integers'][name])
+            elif name in FLOAT32_COLUMNS:
+                values = column.to_numpy(zero_copy_only=False).astype('float32')
+            else:
+                values = column.to_numpy(zero_copy_only=False)
+            store(name, values)
+    for file in outputs.values():
+        file.close()
+    with open(os.path.join(tmp_dir, MMAP_MANIFEST), 'w') as file:
+        json.dump(layout, file)
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # Outro processo gravou a mesma versão antes
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if prune:
+        prune_mmap(content_hash, zomato_path)
+    return directory
+
+def prune_mmap(content_hash, zomato_path=ZOMATO_PATH):
+    """
+    Apaga as colunas mapeadas das versões diferentes de content_hash (os processos
+    que ainda as mapeiam continuam lendo os arquivos apagados)
+    """
+    parent = os.path.dirname(mmap_dir(content_hash, zomato_path))
+    for name in os.listdir(parent):
+        if name != content_hash and not name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+def ensure_mmap(files, content_hash, zomato_path=ZOMATO_PATH):
+    """Grava as colunas mapeadas da versão content_hash, se elas ainda não existirem"""
+    directory = mmap_dir(content_hash, zomato_path)
+    if not os.path.exists(os.path.join(directory, MMAP_MANIFEST)):
+        with span('load.write_mmap'):
+            write_mmap(files, content_hash, zomato_path)
+    return directory
+
+def read_only(series):
+    """Marca os valores da coluna (os códigos, nas categorias) como somente leitura"""
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series.to_numpy().flags.writeable = False
+    return series
+
+def read_mapped(directory, files, columns):
+    """
+    Colunas do df1 a partir dos arquivos mapeados em memória, sem cópia das
+    colunas numéricas e dos códigos das categorias. Os textos livres são lidos do
+    Parquet. Todas as colunas ficam somente leitura: alterar o df1 compartilhado
+    in place levanta ValueError
+    """
+    with open(os.path.join(directory, MMAP_MANIFEST)) as file:
+        layout = json.load(file)
+    def mapped(name):
+        # Visão ndarray do np.memmap (sem cópia), para o pandas não carregar a subclasse
+        return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+    index = pd.Index(mapped('__index_level_0__'), copy=False) if layout['index'] else pd.RangeIndex(layout['rows'])
+    data = {}
+    texts = [col for col in columns if layout['kinds'][col] == 'parquet']
+    if texts:
+        df_aux = read_snapshot(files, texts)
+        for col in texts:
+            data[col] = read_only(pd.Series(df_aux[col].to_numpy(), index=index, name=col, copy=False))
+    for col in columns:
+        if layout['kinds'][col] == 'category':
+            dtype = pd.CategoricalDtype(pd.Index(layout['categories'][col], dtype=object))
+            values = pd.Categorical.from_codes(mapped(col), dtype=dtype, validate=False)
+            data[col] = pd.Series(values, index=index, name=col, copy=False)
+        elif layout['kinds'][col] == 'array':
+            data[col] = pd.Series(mapped(col), index=index, name=col, copy=False)
+    return pd.DataFrame({col: data[col] for col in columns}, copy=False)
+# ====================================================================================
+# Cache do dataset por processo
+# ====================================================================================
+# As colunas do df1 limpo ficam guardadas no processo do servidor e são
+# compartilhadas por todas as páginas e sessões. Cada coluna só é lida do snapshot
+# na primeira vez em que alguma página precisa dela (da cópia mapeada em memória,
+# por padrão). As sessões recebem dataframes que só apontam para essas colunas e
+# guardam apenas as suas seleções. A chave é a "impressão digital" dos arquivos de
+# dados, então qualquer alteração no csv invalida o cache.
+_CACHE = {'state': None}
+_CACHE_LOCK = threading.RLock()
+
+def file_fingerprint(*paths):
+    """Retorna uma tupla (caminho, mtime, tamanho) para cada arquivo informado"""
+    fingerprint = []
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.append((os.path.abspath(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+def _cache_state(key, zomato_path, currencies_path):
+    """Retorna o estado do cache para a chave, recriando-o se os arquivos mudaram"""
+    state = _CACHE['state']
+    if state is None or state['key'] != key:
+        files = ensure_snapshot(zomato_path, currencies_path)
+        names = pq.read_schema(files[0]).names
+        state = {
+            'key': key,
+            'snapshot': files,
+            # O hash da última parte cobre todos os arquivos de origem
+            'hash': snapshot_hash(files[-1]),
+            'all': [col for col in names if not col.startswith('__index_level_')],
+            'mapped': None,
+            'columns': {},
+            'derived': {},
+        }
+        # A troca do estado inteiro é atômica para quem lê sem o lock
+        _CACHE['state'] = state
+    return state
+
+def load_data(columns=None, zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH):
+    """
+    Retorna o dataframe limpo (df1) somente com as colunas pedidas (todas, se
+    columns for None). O csv só é limpo de novo quando os arquivos de dados
+    mudam. As colunas são compartilhadas e somente leitura: não altere o
+    resultado in place.
+    """
+    key = file_fingerprint(*input_files(zomato_path), currencies_path)
+    state = _CACHE['state']
+    if state is None or state['key'] != key or \
+            any(col not in state['columns'] for col in (columns or state['all'])):
+        with _CACHE_LOCK:
+            state = _cache_state(key, zomato_path, currencies_path)
+            missing = [col for col in (columns or state['all']) if col not in state['columns']]
+            if missing:
+                if mmap_enabled():
+                    if state['mapped'] is None:
+                        state['mapped'] = ensure_mmap(state['snapshot'], state['hash'], zomato_path)
+                    with span('load.read_mmap'):
+                        df_aux = read_mapped(state['mapped'], state['snapshot'], missing)
+                else:
+                    with span('load.read_snapshot'):
+                        df_aux = read_snapshot(state['snapshot'], missing)
+                for col in missing:
+                    state['columns'][col] = df_aux[col]
+    return pd.DataFrame({col: state['columns'][col] for col in (columns or state['all'])}, copy=False)
+
+def read_derived(name, content_hash, zomato_path=ZOMATO_PATH):
+    """Lê a estrutura gravada em derived_path, ou retorna None se ela não for da versão content_hash"""
+    path = derived_path(name, zomato_path)
+    if snapshot_hash(path) != content_hash:
+        return None
+    return pd.read_parquet(path)
+
+def load_derived(name, builder, columns=None, zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH,
+                 reader=read_derived):
+    """
+    Retorna uma estrutura derivada do df1 (cubo de agregados, índices...),
+    construída com builder(df1) uma única vez por versão do dataset e
+    compartilhada por todas as sessões. Se a estrutura já foi gravada junto com
+    o snapshot, reader(name, hash do dataset, zomato_path) a lê do arquivo em vez
+    de construí-la (None quando não há arquivo dessa versão)
+    """
+    key = file_fingerprint(*input_files(zomato_path), currencies_path)
+    state = _CACHE['state']
+    if state is None or state['key'] != key or name not in state['derived']:
+        with _CACHE_LOCK:
+            state = _cache_state(key, zomato_path, currencies_path)
+            if name not in state['derived']:
+                with span(f'load.{name}'):
+                    stored = reader(name, state['hash'], zomato_path)
+                if stored is not None:
+                    state['derived'][name] = stored
+                else:
+                    df1 = load_data(columns, zomato_path, currencies_path)
+                    with span(f'aggregate.{name}'):
+                        state['derived'][name] = builder(df1)
+    return state['derived'][name]
+
+def dataset_version(zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH):
+    """Hash da versão atual do dataset: muda sempre que algum arquivo de dados muda"""
+    key = file_fingerprint(*input_files(zomato_path), currencies_path)
+    state = _CACHE['state']
+    if state is None or state['key'] != key:
+        with _CACHE_LOCK:
+            state = _cache_state(key, zomato_path, currencies_path)
+    return state['hash']
+
+def clear_cache():
+    """Esvazia o cache do dataset"""
+    with _CACHE_LOCK:
+        _CACHE['state'] = None
+# ====================================================================================
+
+if __name__ == '__main__':
+    # Etapa de build: python -m utils.data [linhas por bloco]
+    import sys
+    build_snapshot(chunk_size=int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    # As partes das atualizações incrementais e as colunas mapeadas
+    print(*ensure_snapshot(), sep='\n')
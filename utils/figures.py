@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+from utils.data import dataset_version
+
+# ====================================================================================
+# Cache LRU das figuras do Plotly
+# ====================================================================================
+# As figuras ficam guardadas no processo do servidor e são compartilhadas por todas
+# as sessões. A chave é (página, gráfico, seleção normalizada, versão do dataset):
+# seleções repetidas (os países padrão, por exemplo) não recalculam os agregados
+# nem constroem a figura de novo, e um dataset novo invalida as figuras antigas.
+
+# Quantidade de figuras guardadas no cache LRU
+CACHE_SIZE = 128
+
+class FigureCache:
+    """
+    Guarda as figuras construídas mais recentemente, até cache_size figuras. As
+    figuras são compartilhadas: o st.plotly_chart não as altera, e quem usa o
+    cache também não deve alterá-las
+    """
+    def __init__(self, cache_size=CACHE_SIZE):
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, builder):
+        """Retorna a figura da chave, construída com builder() só se ela não estiver no cache"""
+        with self._lock:
+            fig = self._cache.get(key)
+            if fig is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return fig
+            self.misses += 1
+        fig = builder()
+        with self._lock:
+            self._cache[key] = fig
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return fig
+
+    def clear(self):
+        """Esvazia o cache e zera os contadores"""
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+FIGURE_CACHE = FigureCache()
+
+def selection_key(selection):
+    """Seleção normalizada: a ordem e as repetições dos valores escolhidos não importam"""
+    return tuple(sorted((name, tuple(sorted(set(values))))
+                        for name, values in selection.items() if values is not None))
+
+def cached_figure(page, chart, builder, **selection):
+    """
+    Retorna a figura do gráfico chart da página para a seleção (por exemplo
+    countries=['India', 'Brazil']), construída com builder() só na primeira vez
+    """
+    key = (page, chart, selection_key(selection), dataset_version())
+    return FIGURE_CACHE.get(key, builder)
+# ====================================================================================
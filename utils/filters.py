@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.data import load_derived
+from utils.cuisines import load_cuisine_index, member
+
+# ====================================================================================
+# Filtros da barra lateral com bitmaps pré-calculados
+# ====================================================================================
+# Dimensões filtráveis: colunas do df1 (um valor por linha) e o índice de culinárias
+# (todas as culinárias que o restaurante lista)
+FILTER_COLUMNS = ['country_name', 'city']
+
+# Quantidade de combinações de filtros guardadas no cache LRU
+CACHE_SIZE = 256
+
+# Um valor com menos de n_rows / SPARSE_RATIO linhas guarda as posições ordenadas
+# (int32, 4 bytes por linha) em vez do bitmap (n_rows / 8 bytes), como os
+# contêineres do roaring bitmap: a memória de uma dimensão fica limitada pelo
+# número de linhas, qualquer que seja o número de valores (dezenas de milhares de
+# cidades, por exemplo)
+SPARSE_RATIO = 32
+
+class BitmapFilter:
+    """
+    Guarda, para cada país, cidade e culinária, um bitmap (np.packbits, 1 bit por
+    linha do df1) ou, para os valores raros, as posições ordenadas das linhas. Uma
+    seleção é respondida com OR entre os valores de uma dimensão e AND entre as
+    dimensões, sem varrer as colunas de texto. As combinações recentes ficam em
+    um cache LRU. As culinárias só são indexadas na primeira seleção que as usa
+    (cuisine_index carrega o índice de culinárias)
+    """
+    def __init__(self, df1, cuisine_index=load_cuisine_index, cache_size=CACHE_SIZE):
+        self.n_rows = len(df1)
+        self.dtype = np.int32 if self.n_rows < 2**31 else np.int64
+        self.bitmaps = {}
+        self.positions = {}
+        for col in FILTER_COLUMNS:
+            codes, uniques = pd.factorize(df1[col])
+            order = np.argsort(codes, kind='stable').astype(self.dtype)
+            bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+            self._add(col, {value: order[bounds[i]:bounds[i + 1]] for i, value in enumerate(uniques)})
+        self._cuisine_index = cuisine_index
+        self._build_lock = threading.Lock()
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _add(self, dimension, rows_by_value):
+        """Guarda o bitmap ou as posições (ordenadas) de cada valor da dimensão"""
+        self.bitmaps[dimension] = {}
+        self.positions[dimension] = {}
+        for value, rows in rows_by_value.items():
+            if len(rows) * SPARSE_RATIO < self.n_rows:
+                self.positions[dimension][value] = rows
+            else:
+                self.bitmaps[dimension][value] = self._pack(rows)
+
+    def _add_cuisines(self):
+        """Monta a dimensão das culinárias, se ainda não existe"""
+        with self._build_lock:
+            if 'cuisines' in self.positions:
+                return
+            cuisine_index = self._cuisine_index()
+            # As posições das culinárias raras são fatias do próprio índice de culinárias
+            self._add('cuisines', {cuisine: cuisine_index.rows(cuisine) for cuisine in cuisine_index.cuisines})
+
+    def _pack(self, rows):
+        """Converte posições de linhas em um bitmap"""
+        lines = np.zeros(self.n_rows, dtype=bool)
+        lines[rows] = True
+        return np.packbits(lines)
+
+    def _dimension(self, dimension, values):
+        """OR dos bitmaps (ou None) e união das posições dos valores selecionados da dimensão"""
+        bitmap = None
+        for value in values:
+            if value in self.bitmaps[dimension]:
+                if bitmap is None:
+                    bitmap = self.bitmaps[dimension][value].copy()
+                else:
+                    np.bitwise_or(bitmap, self.bitmaps[dimension][value], out=bitmap)
+        arrays = [self.positions[dimension][value] for value in values if value in self.positions[dimension]]
+        if not arrays:
+            return bitmap, np.empty(0, dtype=self.dtype)
+        if len(arrays) == 1:
+            return bitmap, arrays[0]
+        rows = np.sort(np.concatenate(arrays))
+        # Um restaurante aparece em mais de uma das suas culinárias
+        return bitmap, rows[np.concatenate([[True], rows[1:] != rows[:-1]])]
+
+    def _combine(self, selection):
+        """OR dentro de cada dimensão e AND entre as dimensões"""
+        if not selection:
+            return np.arange(self.n_rows)
+        if any(dimension == 'cuisines' for dimension, _ in selection):
+            self._add_cuisines()
+        # Começa pelas dimensões só com posições (as menores); as demais são
+        # conferidas bit a bit, só nas linhas que restaram
+        dimensions = sorted((self._dimension(dimension, values) for dimension, values in selection),
+                            key=lambda part: (part[0] is not None, len(part[1])))
+        bitmap, rows = dimensions[0]
+        if bitmap is not None:
+            np.bitwise_or.at(bitmap, rows >> 3, (128 >> (rows & 7)).astype(np.uint8))
+            rows = np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+        for bitmap, positions in dimensions[1:]:
+            inside = member(positions, rows)
+            if bitmap is not None:
+                inside |= (bitmap[rows >> 3] >> (7 - (rows & 7))) & 1 == 1
+            rows = rows[inside]
+        return rows.astype(np.intp, copy=False)
+
+    def nbytes(self):
+        """Memória ocupada pelos bitmaps e pelas posições (sem as fatias do índice de culinárias)"""
+        total = sum(bitmap.nbytes for bitmaps in self.bitmaps.values() for bitmap in bitmaps.values())
+        return total + sum(rows.nbytes for dimension in FILTER_COLUMNS for rows in self.positions[dimension].values())
+
+    def rows(self, **selection):
+        """
+        Retorna as posições (ordenadas, somente leitura) das linhas que atendem a
+        seleção, por exemplo rows(country_name=['India'], cuisines=['Italian']).
+        Dimensões ausentes (ou None) não filtram; uma lista vazia não seleciona nada
+        """
+        key = tuple(sorted((dimension, tuple(sorted(set(values))))
+                           for dimension, values in selection.items() if values is not None))
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return rows
+            self.misses += 1
+        rows = self._combine(key)
+        rows.flags.writeable = False
+        with self._lock:
+            self._cache[key] = rows
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+def category_mask(series, values):
+    """
+    Máscara das linhas de uma coluna categórica cujo valor está em values, pelos
+    códigos da categoria (sem comparar textos nem passar pelo isin do pandas)
+    """
+    categories = series.cat.categories
+    selected = np.zeros(len(categories) + 1, dtype=bool)
+    found = categories.get_indexer(pd.Index(list(values), dtype=object))
+    # O último elemento recebe os valores nulos e os que não são categorias (código -1)
+    selected[found[found >= 0]] = True
+    return selected[series.array.codes]
+
+def select(df, rows, columns=None):
+    """Retorna somente as linhas (e colunas) selecionadas de df, sem copiar o resto"""
+    if columns is None:
+        return df.take(rows)
+    return df.iloc[rows, [df.columns.get_loc(col) for col in columns]]
+
+def load_bitmap_filter():
+    """Retorna o filtro de bitmaps do dataset atual, construído uma única vez por processo"""
+    return load_derived('bitmap_filter', BitmapFilter, FILTER_COLUMNS)
+# ====================================================================================
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from utils.data import load_derived
+
+# ====================================================================================
+# Grade hierárquica de restaurantes para o mapa
+# ====================================================================================
+# As células seguem os tiles do Leaflet (Web Mercator): no zoom z o mundo tem
+# 2**z x 2**z tiles de 256 px, e cada tile é dividido em 2**CELL_SHIFT x 2**CELL_SHIFT
+# células. Assim uma célula ocupa sempre o mesmo tamanho na tela (64 px) e a
+# quantidade de células visíveis não depende do número de restaurantes. As células
+# de um zoom são a soma de quatro células do zoom seguinte.
+
+# A partir deste zoom o mapa mostra os restaurantes, e não as células
+DETAIL_ZOOM = 12
+
+# Cada tile de 256 px tem 4 x 4 células de 64 px
+CELL_SHIFT = 2
+
+# Nível (em potências de 2) das células mais finas
+MAX_LEVEL = DETAIL_ZOOM - 1 + CELL_SHIFT
+
+# Latitude máxima da projeção Web Mercator
+MAX_LATITUDE = 85.0511287798
+
+# Colunas do df1 usadas pela grade
+GRID_COLUMNS = ['country_name', 'latitude', 'longitude', 'aggregate_rating']
+
+# Medidas somáveis de cada célula
+CELL_MEASURES = ['count', 'rating_sum', 'latitude_sum', 'longitude_sum']
+
+def tile_xy(latitude, longitude, level):
+    """Coordenadas (fracionárias) de tile do Web Mercator no nível informado"""
+    latitude = np.radians(np.clip(np.asarray(latitude, dtype='float64'), -MAX_LATITUDE, MAX_LATITUDE))
+    longitude = np.asarray(longitude, dtype='float64')
+    size = 2.0 ** level
+    x = (longitude + 180.0) / 360.0 * size
+    y = (1.0 - np.arcsinh(np.tan(latitude)) / np.pi) / 2.0 * size
+    return np.clip(x, 0, size - 1), np.clip(y, 0, size - 1)
+
+class MapGrid:
+    """
+    Contagem, soma das notas e soma das coordenadas dos restaurantes de cada
+    célula, por país, para cada zoom abaixo de DETAIL_ZOOM. As medidas são
+    somáveis: qualquer seleção de países é respondida somando as células
+    """
+    def __init__(self, df1):
+        df_aux = df1.loc[:, GRID_COLUMNS].dropna(subset=['latitude', 'longitude'])
+        x, y = tile_xy(df_aux['latitude'], df_aux['longitude'], MAX_LEVEL)
+        # As notas têm uma casa decimal; o arredondamento desfaz o erro do float32
+        cells = pd.DataFrame({
+            'country_name': df_aux['country_name'].to_numpy(),
+            'x': x.astype(np.int64),
+            'y': y.astype(np.int64),
+            'count': 1,
+            'rating_sum': df_aux['aggregate_rating'].astype('float64').round(1).to_numpy(),
+            'latitude_sum': df_aux['latitude'].astype('float64').to_numpy(),
+            'longitude_sum': df_aux['longitude'].astype('float64').to_numpy(),
+        })
+        # Cada nível é agrupado a partir do nível seguinte (mais fino), e não das linhas
+        self.levels = [None] * DETAIL_ZOOM
+        for zoom in reversed(range(DETAIL_ZOOM)):
+            shift = MAX_LEVEL - (zoom + CELL_SHIFT) if zoom == DETAIL_ZOOM - 1 else 1
+            cells = cells.assign(x=cells['x'].to_numpy() >> shift, y=cells['y'].to_numpy() >> shift)
+            cells = cells.groupby(['country_name', 'x', 'y'], sort=False, observed=True)[CELL_MEASURES].sum().reset_index()
+            self.levels[zoom] = cells
+
+    def cells(self, zoom, bounds=None, countries=None):
+        """
+        Células do zoom (limitado a DETAIL_ZOOM - 1) dentro de bounds = (sul, oeste,
+        norte, leste), somando os países selecionados. Retorna latitude e longitude
+        médias, quantidade de restaurantes e nota média de cada célula
+        """
+        zoom = min(max(int(zoom), 0), DETAIL_ZOOM - 1)
+        cells = self.levels[zoom]
+        lines = np.ones(len(cells), dtype=bool)
+        if countries is not None:
+            lines &= cells['country_name'].isin(countries).to_numpy()
+        if bounds is not None:
+            lines &= self._in_bounds(cells, zoom + CELL_SHIFT, bounds)
+        df_aux = cells.loc[lines, :].groupby(['x', 'y'], sort=False)[CELL_MEASURES].sum()
+        return pd.DataFrame({
+            'latitude': df_aux['latitude_sum'] / df_aux['count'],
+            'longitude': df_aux['longitude_sum'] / df_aux['count'],
+            'count': df_aux['count'],
+            'rating_mean': df_aux['rating_sum'] / df_aux['count'],
+        }).reset_index(drop=True)
+
+    @staticmethod
+    def _in_bounds(cells, level, bounds):
+        """Células que cruzam o retângulo bounds (que pode atravessar o antimeridiano)"""
+        south, west, north, east = bounds
+        x0, y1 = tile_xy(south, ((west + 180) % 360) - 180, level)
+        x1, y0 = tile_xy(north, ((east + 180) % 360) - 180, level)
+        x, y = cells['x'].to_numpy(), cells['y'].to_numpy()
+        lines = (y >= int(y0)) & (y <= int(y1))
+        if east - west >= 360:
+            return lines
+        if x0 <= x1:
+            return lines & (x >= int(x0)) & (x <= int(x1))
+        return lines & ((x >= int(x0)) | (x <= int(x1)))
+
+def load_map_grid():
+    """Retorna a grade do mapa do dataset atual, construída uma única vez por processo"""
+    return load_derived('map_grid', MapGrid, GRID_COLUMNS)
+# ====================================================================================
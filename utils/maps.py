@@ -0,0 +1,188 @@
+import functools
+import json
+from importlib.metadata import PackageNotFoundError, version
+
+import folium
+import numpy as np
+from jinja2 import Template
+
+from utils.grid import DETAIL_ZOOM
+
+# ====================================================================================
+# Mapa de restaurantes para grandes volumes
+# ====================================================================================
+# O mapa é desenhado uma única vez; só a camada de dados é trocada quando o zoom ou a
+# área visível mudam. Abaixo de DETAIL_ZOOM a camada mostra as células da grade
+# (utils.grid) com a quantidade de restaurantes e a nota média; a partir dele,
+# os restaurantes da área visível. O que vai ao navegador depende da área na tela,
+# e não do total de restaurantes.
+MAP_LOCATION = [27.919478, -16.905911]
+MAP_ZOOM = 2
+
+# Casas decimais das coordenadas enviadas ao navegador (~1 m de precisão)
+COORD_DECIMALS = 5
+
+# Máximo de pontos enviados ao navegador. Acima disso, os restaurantes próximos
+# são agrupados no servidor em um único ponto, mantendo o tamanho da página limitado
+MAX_POINTS = 2_000
+
+# Margem (fração da largura e da altura) carregada em volta da área visível, para
+# que um deslocamento pequeno não mostre áreas vazias antes da atualização
+VIEW_MARGIN = 0.25
+
+# Cria cada marcador no navegador a partir de uma linha [lat, lon, nome, quantidade].
+# O nome entra como texto (e não como HTML) no popup.
+MARKER_CALLBACK = """
+    function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]));
+        var popup = document.createElement('div');
+        popup.textContent = row[3] > 1 ? row[2] + ' (+' + (row[3] - 1) + ' restaurantes)' : row[2];
+        marker.bindPopup(popup);
+        return marker;
+    }
+"""
+
+# Cria cada célula da grade a partir de uma linha [lat, lon, quantidade, nota média]:
+# o raio cresce com a quantidade de restaurantes e a cor segue a nota média
+CELL_CALLBACK = """
+    function (row) {
+        var rating = row[3];
+        var color = rating >= 4 ? '#3F7E00' : (rating >= 3.5 ? '#9ACD32' : (rating >= 2.5 ? '#FF7800' : '#CB202D'));
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+            radius: 6 + 4 * Math.log10(row[2]), color: color, weight: 1, fillColor: color, fillOpacity: 0.6});
+        var tooltip = document.createElement('div');
+        tooltip.textContent = row[2] + ' restaurantes, nota média ' + rating.toFixed(2);
+        marker.bindTooltip(tooltip);
+        return marker;
+    }
+"""
+
+def script_json(rows):
+    """JSON compacto das linhas, com o mesmo escape do filtro tojson (não fecha a tag <script>)"""
+    data_json = json.dumps(rows, separators=(',', ':'), ensure_ascii=False)
+    return (data_json.replace('<', '\\u003c').replace('>', '\\u003e')
+                     .replace('&', '\\u0026').replace("'", '\\u0027'))
+
+class DataLayer(folium.FeatureGroup):
+    """
+    FeatureGroup cujos marcadores são criados no navegador a partir de um único
+    array JSON, em vez de um objeto do folium (e seu código JavaScript) por marcador
+    """
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.featureGroup({{ this.options|tojson }});
+            (function(){
+                var callback = {{ this.callback }};
+                var data = {{ this.data_json }};
+                for (var i = 0; i < data.length; i++) {
+                    callback(data[i]).addTo({{ this.get_name() }});
+                }
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, points, callback, **kwargs):
+        super().__init__(**kwargs)
+        self.callback = callback.strip()
+        self.data_json = script_json(points.to_numpy().tolist())
+
+def map_points(df, max_points=MAX_POINTS):
+    """
+    Retorna os pontos [latitude, longitude, nome, quantidade] do mapa. Enquanto
+    houver mais pontos que max_points, as coordenadas são arredondadas com uma
+    casa decimal a menos e os restaurantes que caem no mesmo ponto são agrupados
+    """
+    points = df.loc[:, ['latitude', 'longitude', 'restaurant_name']].dropna()
+    points = points.assign(latitude=points['latitude'].round(COORD_DECIMALS),
+                           longitude=points['longitude'].round(COORD_DECIMALS),
+                           restaurant_name=points['restaurant_name'].astype(str),
+                           count=1)
+    decimals = COORD_DECIMALS
+    while len(points) > max_points and decimals > 0:
+        decimals -= 1
+        points = points.assign(latitude=points['latitude'].round(decimals),
+                               longitude=points['longitude'].round(decimals))
+        points = points.groupby(['latitude', 'longitude'], sort=False).agg(
+            restaurant_name=('restaurant_name', 'first'),
+            count=('count', 'sum')).reset_index()
+    return points
+
+def base_map(location=MAP_LOCATION, zoom_start=MAP_ZOOM):
+    """Mapa sem dados: os restaurantes entram pela camada de map_layer"""
+    return folium.Map(location=location, zoom_start=zoom_start)
+
+# Versões do streamlit_folium em que map_state_key reproduz a chave do componente
+# (conferida com a 0.23.1 de requirements.txt)
+STATE_KEY_VERSIONS = ('0.23.',)
+
+@functools.lru_cache
+def map_state_key(key):
+    """
+    Chave em que o st_folium guarda o estado do mapa de base_map (zoom, área...) na
+    sessão, ou None se o streamlit_folium instalado não for de uma versão conferida.
+    O st_folium registra o componente com um hash do código do mapa e da chave
+    informada; com ela, a página lê o estado da última interação antes de chamar o
+    st_folium, e monta a camada da visão nova já nessa execução
+    """
+    # O hash é feito por funções internas do streamlit_folium, que podem mudar em
+    # outra versão: fora das versões conferidas, a página usa o estado retornado
+    try:
+        if not version('streamlit_folium').startswith(STATE_KEY_VERSIONS):
+            return None
+        from streamlit_folium import _get_map_string, generate_js_hash
+    except (PackageNotFoundError, ImportError):
+        return None
+    # O código é gerado de um mapa próprio: _get_map_string altera o mapa, e o
+    # passado ao st_folium passaria a gerar outra chave
+    fig = base_map()
+    fig.render()
+    return generate_js_hash(_get_map_string(fig), key, False)
+
+def map_view(state=None):
+    """
+    Zoom e área visível (sul, oeste, norte, leste) retornados pelo st_folium, com a
+    margem VIEW_MARGIN. Sem área conhecida (primeira execução), o mundo inteiro
+    """
+    state = state or {}
+    zoom = state.get('zoom')
+    if zoom is None:
+        zoom = MAP_ZOOM
+    bounds = state.get('bounds') or {}
+    south_west, north_east = bounds.get('_southWest') or {}, bounds.get('_northEast') or {}
+    corners = [south_west.get('lat'), south_west.get('lng'), north_east.get('lat'), north_east.get('lng')]
+    if any(value is None for value in corners):
+        return int(zoom), None
+    south, west, north, east = corners
+    height, width = (north - south) * VIEW_MARGIN, (east - west) * VIEW_MARGIN
+    # O arredondamento evita recalcular a camada por diferenças mínimas
+    return int(zoom), tuple(round(value, 4) for value in (south - height, west - width, north + height, east + width))
+
+def in_bounds(df, bounds):
+    """Máscara das linhas de df com coordenadas dentro de bounds (sul, oeste, norte, leste)"""
+    south, west, north, east = bounds
+    latitude = df['latitude'].to_numpy()
+    longitude = df['longitude'].to_numpy()
+    lines = (latitude >= south) & (latitude <= north)
+    if east - west >= 360:
+        return lines
+    west, east = ((west + 180) % 360) - 180, ((east + 180) % 360) - 180
+    if west <= east:
+        return lines & (longitude >= west) & (longitude <= east)
+    return lines & ((longitude >= west) | (longitude <= east))
+
+def map_layer(view, map_grid, df, countries=None, max_points=MAX_POINTS):
+    """
+    Camada de dados para a visão (zoom, área) de map_view: as células da grade dos
+    países selecionados abaixo de DETAIL_ZOOM, ou os restaurantes de df (já
+    filtrado pelos países) dentro da área a partir dele
+    """
+    zoom, bounds = view
+    if zoom < DETAIL_ZOOM:
+        cells = map_grid.cells(zoom, bounds, countries)
+        return DataLayer(cells.loc[:, ['latitude', 'longitude', 'count', 'rating_mean']], CELL_CALLBACK,
+                         name='Restaurantes')
+    if bounds is not None:
+        df = df.iloc[np.flatnonzero(in_bounds(df, bounds))]
+    return DataLayer(map_points(df, max_points), MARKER_CALLBACK, name='Restaurantes')
+# ====================================================================================
@@ -0,0 +1,154 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.cube import load_cube, rollup
+from utils.cuisines import CuisineIndex
+from utils.data import dataset_version, load_data, load_derived, snapshot_base, snapshot_hash, write_table
+from utils.paths import ZOMATO_PATH
+from utils.topk import top_k, top_k_per_group
+from utils.tracing import span
+
+# ====================================================================================
+# Métricas pré-calculadas das páginas
+# ====================================================================================
+# Todas as métricas que as páginas mostram são calculadas de uma vez, para todos os
+# países, e gravadas como arquivos Parquet em snapshot_base() + '.metrics'. Cada
+# arquivo guarda nos metadados o hash do dataset e a versão das métricas: as
+# páginas só leem as tabelas (e fazem recortes pequenos nelas); se os arquivos
+# forem de outra versão, as métricas são calculadas no processo, uma única vez.
+# Uso: python -m utils.metrics (depois do build do snapshot ou de um upsert)
+
+# Versão das métricas: incremente quando o cálculo ou as tabelas mudarem
+METRICS_VERSION = 1
+
+# Colunas do df1 usadas pelas métricas de restaurantes
+METRIC_COLUMNS = ['restaurant_id', 'restaurant_name', 'country_name', 'city', 'cuisines', 'all_cuisines',
+                  'aggregate_rating', 'average_cost_for_two_us_dollar', 'votes']
+
+# Colunas da tabela de melhores restaurantes da página de culinárias
+RESTAURANT_COLUMNS = ['restaurant_id', 'restaurant_name', 'country_name', 'city', 'all_cuisines',
+                      'average_cost_for_two_us_dollar', 'aggregate_rating', 'votes']
+
+# Colunas dos restaurantes com maior nota do dataset (página de culinárias)
+TOP_RATED_COLUMNS = ['cuisines', 'aggregate_rating', 'restaurant_name']
+
+# Maior quantidade de restaurantes da tabela (o slider vai até 20, e a página mostra um a mais)
+TOP_RESTAURANTS = 21
+
+def metrics_dir(zomato_path=ZOMATO_PATH):
+    """Pasta com as tabelas de métricas do dataset"""
+    return snapshot_base(zomato_path) + '.metrics'
+
+def metrics_hash(content_hash):
+    """Versão gravada nas tabelas: o hash do dataset e a versão das métricas"""
+    return f'{content_hash}.metrics{METRICS_VERSION}'
+
+def top_rated(df1, k=5):
+    """Os k restaurantes com maior nota do dataset"""
+    return top_k(df1.loc[:, TOP_RATED_COLUMNS], 'aggregate_rating', k)
+
+def best_restaurants(df1, k=TOP_RESTAURANTS):
+    """
+    Os k restaurantes com maior nota de cada (país, culinária), com a posição da
+    linha no df1 e uma linha por culinária listada. A tabela de qualquer seleção
+    de países e culinárias está contida na união das tabelas dos pares selecionados
+    """
+    # As linhas repetidas de um mesmo restaurante são idênticas: basta a primeira
+    first = np.flatnonzero(~df1['restaurant_id'].duplicated().to_numpy())
+    df_aux = df1.iloc[first, [df1.columns.get_loc(col) for col in RESTAURANT_COLUMNS]].reset_index(drop=True)
+    df_aux['position'] = first
+    cuisine_index = CuisineIndex(df_aux['all_cuisines'])
+    parts = []
+    for cuisine in cuisine_index.cuisines:
+        # As linhas de cada culinária ficam na ordem do df1, para que os empates
+        # sejam resolvidos como na página
+        part = top_k_per_group(df_aux.take(cuisine_index.rows(cuisine)), 'country_name', 'aggregate_rating', k)
+        parts.append(part.assign(cuisine=cuisine))
+    df_aux = pd.concat(parts, ignore_index=True).sort_values('position', kind='stable')
+    return df_aux.astype({'cuisine': 'category'}).reset_index(drop=True)
+
+def build_metrics(df1, cube=None):
+    """Calcula todas as tabelas de métricas das páginas a partir do df1 e do cubo"""
+    if cube is None:
+        cube = load_cube()
+    metrics = {}
+    # Home: números gerais da empresa
+    metrics['overview'] = pd.DataFrame({
+        'restaurants': [cube['distinct_restaurants'].sum()],
+        'countries': [cube['country_name'].nunique()],
+        'cities': [cube['city'].nunique()],
+        'votes': [cube['votes'].sum()],
+        'cuisines': [cube['cuisines'].nunique()],
+    })
+    # Países e cidades: as medidas de cada país (ou cidade) não dependem dos outros,
+    # então os filtros das páginas só escolhem linhas destas tabelas
+    countries = rollup(cube, ['country_name'])
+    # Ordem dos países nos seletores: a ordem de aparição no dataset (o cubo
+    # atualizado pelo upsert mantém as células na posição antiga)
+    countries['order'] = pd.Index(df1['country_name'].unique()).get_indexer(countries['country_name'])
+    metrics['countries'] = countries
+    metrics['cities'] = rollup(cube, ['country_name', 'city'])
+
+    # Culinárias: nota média de cada culinária, considerando todas as culinárias
+    # de cada restaurante. As notas têm uma casa decimal; o arredondamento desfaz o erro do float32.
+    cuisine_index = CuisineIndex(df1['all_cuisines'])
+    rating = df1['aggregate_rating'].astype('float64').round(1).to_numpy()
+    cuisines = cuisine_index.aggregate(rating)
+    cuisines['rating_mean'] = cuisines['sum'] / cuisines['count']
+    # Somente as notas diferentes de zero
+    nonzero = cuisine_index.aggregate(rating, where=(rating != 0.0))
+    cuisines['nonzero_sum'] = nonzero['sum']
+    cuisines['nonzero_count'] = nonzero['count']
+    cuisines['rating_nonzero_mean'] = nonzero['sum'] / nonzero['count'].replace(0, np.nan)
+    metrics['cuisines'] = cuisines
+    metrics['top_rated'] = top_rated(df1)
+    metrics['best_restaurants'] = best_restaurants(df1)
+    return metrics
+
+def write_metrics(metrics, content_hash, zomato_path=ZOMATO_PATH):
+    """Grava as tabelas de métricas, cada uma com o hash do dataset e a versão das métricas"""
+    directory = metrics_dir(zomato_path)
+    os.makedirs(directory, exist_ok=True)
+    for name, table in metrics.items():
+        # Só as categorias usadas vão para o arquivo
+        categories = table.select_dtypes('category').columns
+        table = table.assign(**{col: table[col].cat.remove_unused_categories() for col in categories})
+        write_table(table, os.path.join(directory, f'{name}.parquet'), metrics_hash(content_hash))
+    # Tabelas de versões anteriores que não existem mais
+    for path in glob.glob(os.path.join(glob.escape(directory), '*.parquet')):
+        if os.path.splitext(os.path.basename(path))[0] not in metrics:
+            os.remove(path)
+    return directory
+
+def read_metrics(name, content_hash, zomato_path=ZOMATO_PATH):
+    """
+    Lê as tabelas de métricas gravadas, ou retorna None se alguma delas não for da
+    versão atual do dataset e das métricas
+    """
+    paths = sorted(glob.glob(os.path.join(glob.escape(metrics_dir(zomato_path)), '*.parquet')))
+    if not paths or any(snapshot_hash(path) != metrics_hash(content_hash) for path in paths):
+        return None
+    return {os.path.splitext(os.path.basename(path))[0]: pd.read_parquet(path) for path in paths}
+
+def load_metrics():
+    """
+    Retorna as tabelas de métricas do dataset atual: lidas dos arquivos do
+    utils.metrics ou, sem eles, calculadas uma única vez por processo
+    """
+    return load_derived('metrics', build_metrics, METRIC_COLUMNS, reader=read_metrics)
+
+def precompute():
+    """Calcula e grava todas as métricas do dataset atual. Retorna a pasta das tabelas"""
+    df1 = load_data(METRIC_COLUMNS)
+    cube = load_cube()
+    with span('aggregate.metrics'):
+        metrics = build_metrics(df1, cube)
+    return write_metrics(metrics, dataset_version())
+# ====================================================================================
+
+if __name__ == '__main__':
+    # Etapa de build: python -m utils.metrics
+    print(precompute())
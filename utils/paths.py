@@ -0,0 +1,14 @@
+import os
+
+# ====================================================================================
+# Caminhos dos arquivos de dados
+# ====================================================================================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# A pasta de dados pode ser trocada pela variável de ambiente ZOMATO_DATASET_DIR
+# (usada pelos benchmarks para rodar as páginas com datasets maiores)
+DATASET_DIR = os.environ.get('ZOMATO_DATASET_DIR', os.path.join(BASE_DIR, 'dataset'))
+# Os restaurantes podem vir de um único csv ou de vários (um por país ou região):
+# ZOMATO_PATH aceita um arquivo, uma pasta com arquivos .csv ou um padrão glob
+ZOMATO_PATH = os.environ.get('ZOMATO_PATH', os.path.join(DATASET_DIR, 'zomato.csv'))
+CURRENCIES_PATH = os.path.join(DATASET_DIR, 'currencies.csv')
+# ====================================================================================
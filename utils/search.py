@@ -0,0 +1,161 @@
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from utils.cuisines import member
+from utils.data import load_derived
+
+# ====================================================================================
+# Busca aproximada de restaurantes por nome, cidade e bairro
+# ====================================================================================
+# Índice invertido de trigramas (como o pg_trgm): cada palavra é normalizada (sem
+# acentos, minúscula), recebe espaços nas pontas e é quebrada em trechos de 3
+# caracteres. Uma busca soma, para cada restaurante, quantos trigramas da consulta
+# ele contém; erros de digitação só afetam os trigramas em volta do erro. Os
+# restaurantes são numerados do mais votado ao menos votado, então cada lista de
+# restaurantes de um trigrama começa pelos mais votados: uma consulta lê no máximo
+# CANDIDATE_BUDGET posições dessas listas, qualquer que seja o tamanho do dataset.
+#
+# O limite troca revocação por tempo. Os candidatos saem das listas dos trigramas
+# mais raros da consulta que cabem no limite; os trigramas comuns só somam pontos a
+# esses candidatos. Um restaurante fora dessas listas não aparece, mesmo que tenha
+# muitos trigramas comuns da consulta, e uma lista maior que o limite sozinha fica
+# só com os mais votados. Com 185 mil restaurantes, os 10 primeiros resultados
+# ficaram iguais aos da busca sem limite em 400 consultas (nomes com erros de
+# digitação, nome e cidade, bairros, palavras comuns), em 4 ms contra 11 ms; com 50
+# resultados, 31 das 400 consultas trocaram algum dos últimos por outro de nota
+# menor. No dataset original (7 mil restaurantes) nenhuma das consultas mudou.
+SEARCH_COLUMNS = ['restaurant_id', 'restaurant_name', 'city', 'locality', 'votes']
+
+# Colunas de texto indexadas
+TEXT_FIELDS = ['restaurant_name', 'city', 'locality']
+
+# Máximo de posições lidas das listas de trigramas em uma consulta
+CANDIDATE_BUDGET = 10_000
+
+# Fração mínima dos trigramas da consulta encontrados no restaurante
+MIN_SCORE = 0.3
+
+WORD = re.compile(r'\w+')
+
+def normalize(text):
+    """Palavras do texto, minúsculas e sem acentos"""
+    text = str(text).lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD.findall(text)
+
+def word_trigrams(word):
+    """Trigramas da palavra, com '  ' antes e ' ' depois"""
+    word = f'  {word} '
+    return [word[i:i + 3] for i in range(len(word) - 2)]
+
+def trigrams(text):
+    """Conjunto de trigramas das palavras do texto"""
+    return {trigram for word in normalize(text) for trigram in word_trigrams(word)}
+
+class SearchIndex:
+    """
+    Índice de trigramas dos restaurantes (uma linha por restaurant_id) sobre nome,
+    cidade e bairro. Os restaurantes de todos os trigramas ficam em um único array:
+    os do trigrama i são docs[offsets[i]:offsets[i + 1]], em ordem crescente
+    """
+    def __init__(self, df1):
+        # As linhas repetidas de um mesmo restaurante são idênticas: basta a primeira.
+        # Os restaurantes são numerados do mais votado ao menos votado
+        first = np.flatnonzero(~df1['restaurant_id'].duplicated().to_numpy())
+        votes = df1['votes'].to_numpy()[first]
+        self.positions = first[np.argsort(-votes.astype('int64'), kind='stable')]
+        n_docs = len(self.positions)
+        self.vocabulary = {}
+        words = {}
+        pairs_docs, pairs_trigrams = [], []
+        for field in TEXT_FIELDS:
+            # Os trigramas de cada valor distinto (nomes de redes, cidades, bairros) são
+            # calculados uma única vez
+            codes, uniques = pd.factorize(df1[field].take(self.positions))
+            value_trigrams = [self._trigram_ids(value, words) for value in uniques]
+            lengths = np.array([len(ids) for ids in value_trigrams] + [0], dtype=np.int64)
+            starts = np.concatenate([[0], np.cumsum(lengths[:-1])])
+            flat = np.concatenate(value_trigrams + [np.empty(0, dtype=np.int64)])
+            # Valores ausentes (código -1) não têm trigramas
+            doc_lengths = lengths[codes]
+            total = doc_lengths.sum()
+            offsets = np.repeat(starts[codes] - np.cumsum(doc_lengths) + doc_lengths, doc_lengths)
+            pairs_docs.append(np.repeat(np.arange(n_docs, dtype=np.int64), doc_lengths))
+            pairs_trigrams.append(flat[offsets + np.arange(total)])
+        # Um trigrama que aparece em mais de um campo conta uma vez por restaurante
+        n_trigrams = max(len(self.vocabulary), 1)
+        keys = np.sort(np.concatenate(pairs_trigrams) * n_docs + np.concatenate(pairs_docs))
+        keys = keys[np.concatenate([[True], keys[1:] != keys[:-1]])]
+        trigram_ids, docs = np.divmod(keys, n_docs)
+        self.docs = docs
+        self.offsets = np.searchsorted(trigram_ids, np.arange(n_trigrams + 1))
+        # Quantidade de trigramas distintos de cada restaurante
+        self.sizes = np.bincount(docs, minlength=n_docs)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _trigram_ids(self, value, words):
+        """Números dos trigramas do valor; os trigramas de cada palavra ficam em words"""
+        ids = set()
+        for word in normalize(value):
+            if word not in words:
+                words[word] = [self.vocabulary.setdefault(trigram, len(self.vocabulary))
+                               for trigram in word_trigrams(word)]
+            ids.update(words[word])
+        return np.fromiter(ids, dtype=np.int64, count=len(ids))
+
+    def _postings(self, trigram_id):
+        return self.docs[self.offsets[trigram_id]:self.offsets[trigram_id + 1]]
+
+    def search(self, query, k=10, min_score=MIN_SCORE, budget=CANDIDATE_BUDGET):
+        """
+        Os k restaurantes mais parecidos com a consulta. A nota é a fração dos
+        trigramas da consulta encontrados no restaurante; empates são desfeitos
+        pela semelhança com o texto todo (textos mais curtos primeiro) e pelos
+        votos. Retorna as posições das linhas no df1 e as notas.
+
+        budget limita as posições lidas das listas de trigramas (CANDIDATE_BUDGET):
+        acima dele, restaurantes que só têm os trigramas comuns da consulta ou que
+        estão no fim de uma lista longa podem ficar de fora. budget=None faz a busca
+        exata
+        """
+        budget = len(self.docs) if budget is None else budget
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype='float64')
+        ids = [self.vocabulary[trigram] for trigram in query_trigrams if trigram in self.vocabulary]
+        # Candidatos: os restaurantes dos trigramas mais raros, até o limite de posições
+        ids.sort(key=lambda trigram_id: self.offsets[trigram_id + 1] - self.offsets[trigram_id])
+        selected, remaining, used = [], [], 0
+        for trigram_id in ids:
+            postings = self._postings(trigram_id)
+            if used + len(postings) <= budget or not selected:
+                # Uma lista maior que o limite sozinha fica só com os mais votados
+                selected.append(postings[:budget])
+                used += len(selected[-1])
+            else:
+                remaining.append(postings)
+        if not selected:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype='float64')
+        candidates, counts = np.unique(np.concatenate(selected), return_counts=True)
+        # Os trigramas comuns só são conferidos nos candidatos
+        for postings in remaining:
+            counts += member(postings, candidates)
+        scores = counts / len(query_trigrams)
+        similarity = counts / (len(query_trigrams) + self.sizes[candidates] - counts)
+        lines = scores >= min_score
+        candidates, scores, similarity = candidates[lines], scores[lines], similarity[lines]
+        # Maior nota, maior semelhança e, por último, mais votos (menor número)
+        order = np.lexsort((candidates, -similarity, -scores))[:k]
+        return self.positions[candidates[order]], scores[order]
+
+def load_search_index():
+    """Retorna o índice de busca do dataset atual, construído uma única vez por processo"""
+    return load_derived('search_index', SearchIndex, SEARCH_COLUMNS)
+# ====================================================================================
@@ -0,0 +1,143 @@
+import numpy as np
+
+from utils.cuisines import CuisineIndex, member
+from utils.data import load_derived
+
+# ====================================================================================
+# Índice espacial para buscas por proximidade
+# ====================================================================================
+# Os restaurantes são separados em células de CELL_DEGREES x CELL_DEGREES graus e
+# guardados ordenados pela célula (linha a linha de latitude). Uma busca calcula as
+# células que cobrem o círculo, encontra as fatias de cada linha com searchsorted e
+# só mede a distância (haversine) dos restaurantes dessas células: o custo depende
+# de quantos restaurantes estão perto do ponto, e não do total de restaurantes.
+EARTH_RADIUS_KM = 6371.0088
+
+# Lado das células em graus (~5,5 km na latitude)
+CELL_DEGREES = 0.05
+
+# Colunas do df1 usadas pelo índice
+SPATIAL_COLUMNS = ['restaurant_id', 'latitude', 'longitude', 'aggregate_rating', 'all_cuisines']
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distância em km (haversine) do ponto até cada uma das coordenadas, em graus"""
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class SpatialIndex:
+    """
+    Índice dos restaurantes (uma linha por restaurant_id, com coordenadas válidas)
+    por células de latitude e longitude. nearest() retorna os k restaurantes mais
+    próximos de um ponto e within() os que estão a até radius_km dele, ambos com
+    filtro opcional de culinárias e nota mínima
+    """
+    def __init__(self, df1, cell_degrees=CELL_DEGREES):
+        latitude = df1['latitude'].astype('float64').to_numpy()
+        longitude = df1['longitude'].astype('float64').to_numpy()
+        # As linhas repetidas de um mesmo restaurante são idênticas: basta a primeira
+        lines = ~df1['restaurant_id'].duplicated().to_numpy()
+        lines &= (np.abs(latitude) <= 90) & (np.abs(longitude) <= 180)
+        positions = np.flatnonzero(lines)
+        self.cell_degrees = cell_degrees
+        self.n_cols = int(np.ceil(360 / cell_degrees))
+        self.n_rows = int(np.ceil(180 / cell_degrees))
+        iy, ix = self._cell(latitude[positions], longitude[positions])
+        keys = iy * self.n_cols + ix
+        order = np.argsort(keys, kind='stable')
+        positions = positions[order]
+        self.keys = keys[order]
+        # Posição de cada restaurante do índice no df1
+        self.positions = positions
+        self.latitude = latitude[positions]
+        self.longitude = longitude[positions]
+        # As notas têm uma casa decimal; o arredondamento desfaz o erro do float32
+        self.rating = df1['aggregate_rating'].astype('float64').round(1).to_numpy()[positions]
+        # Culinárias na ordem do índice
+        self.cuisine_index = CuisineIndex(df1['all_cuisines'].take(positions))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, latitude, longitude):
+        """Linha e coluna da célula de cada coordenada"""
+        iy = np.floor((np.asarray(latitude) + 90) / self.cell_degrees).astype(np.int64)
+        ix = np.floor((np.asarray(longitude) + 180) / self.cell_degrees).astype(np.int64)
+        return np.clip(iy, 0, self.n_rows - 1), ix % self.n_cols
+
+    def _candidates(self, latitude, longitude, radius_km):
+        """Posições (no índice) dos restaurantes das células que cobrem o círculo"""
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = np.degrees(angle)
+        south, north = latitude - dlat, latitude + dlat
+        # Retângulo que contém o círculo na esfera; perto dos polos, todas as longitudes
+        if angle >= np.pi or south <= -90 or north >= 90 or np.sin(angle) >= np.cos(np.radians(latitude)):
+            lon_ranges = [(0, self.n_cols - 1)]
+        else:
+            dlon = np.degrees(np.arcsin(np.sin(angle) / np.cos(np.radians(latitude))))
+            west, east = int(self._cell(latitude, longitude - dlon)[1]), int(self._cell(latitude, longitude + dlon)[1])
+            # O círculo pode atravessar o antimeridiano
+            lon_ranges = [(west, east)] if west <= east else [(west, self.n_cols - 1), (0, east)]
+        row0, row1 = int(self._cell(max(south, -90), 0)[0]), int(self._cell(min(north, 90), 0)[0])
+        rows = np.arange(row0, row1 + 1) * self.n_cols
+        starts = np.concatenate([rows + west for west, _ in lon_ranges])
+        ends = np.concatenate([rows + east + 1 for _, east in lon_ranges])
+        lo = np.searchsorted(self.keys, starts)
+        counts = np.searchsorted(self.keys, ends) - lo
+        # Concatena as fatias [lo, lo + count) sem um laço em Python
+        total = counts.sum()
+        offsets = np.repeat(lo - np.cumsum(counts) + counts, counts)
+        return offsets + np.arange(total)
+
+    def _filter(self, candidates, cuisines=None, min_rating=None):
+        """Mantém os candidatos que listam alguma das culinárias e têm nota >= min_rating"""
+        if min_rating:
+            candidates = candidates[self.rating[candidates] >= min_rating]
+        if cuisines:
+            lines = np.zeros(len(candidates), dtype=bool)
+            for cuisine in cuisines:
+                if cuisine in self.cuisine_index.cuisines:
+                    lines |= member(self.cuisine_index.rows(cuisine), candidates)
+            candidates = candidates[lines]
+        return candidates
+
+    def _search(self, latitude, longitude, radius_km, cuisines=None, min_rating=None):
+        """Candidatos filtrados a até radius_km do ponto, com as distâncias"""
+        candidates = self._filter(self._candidates(latitude, longitude, radius_km), cuisines, min_rating)
+        distances = haversine_km(latitude, longitude, self.latitude[candidates], self.longitude[candidates])
+        inside = distances <= radius_km
+        return candidates[inside], distances[inside]
+
+    def within(self, latitude, longitude, radius_km, cuisines=None, min_rating=None):
+        """
+        Restaurantes a até radius_km do ponto, do mais próximo ao mais distante.
+        Retorna as posições das linhas no df1 e as distâncias em km
+        """
+        candidates, distances = self._search(latitude, longitude, radius_km, cuisines, min_rating)
+        order = np.argsort(distances, kind='stable')
+        return self.positions[candidates[order]], distances[order]
+
+    def nearest(self, latitude, longitude, k, cuisines=None, min_rating=None):
+        """
+        Os k restaurantes mais próximos do ponto, do mais próximo ao mais distante.
+        Retorna as posições das linhas no df1 e as distâncias em km
+        """
+        # O raio começa em uma célula e é multiplicado por 4 até conter k restaurantes
+        # (no pior caso, a Terra inteira)
+        radius_km = np.radians(self.cell_degrees) * EARTH_RADIUS_KM
+        while True:
+            candidates, distances = self._search(latitude, longitude, radius_km, cuisines, min_rating)
+            if len(candidates) >= k or radius_km >= np.pi * EARTH_RADIUS_KM:
+                break
+            radius_km *= 4
+        if len(candidates) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            candidates, distances = candidates[top], distances[top]
+        order = np.argsort(distances, kind='stable')
+        return self.positions[candidates[order]], distances[order]
+
+def load_spatial_index():
+    """Retorna o índice espacial do dataset atual, construído uma única vez por processo"""
+    return load_derived('spatial_index', SpatialIndex, SPATIAL_COLUMNS)
+# ====================================================================================
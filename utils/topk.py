@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# ====================================================================================
+# Top-N com seleção parcial
+# ====================================================================================
+def _sort_key(values, ascending):
+    """
+    Chave numérica em que os menores valores vêm primeiro. Textos viram o código
+    da ordem alfabética e os valores nulos ficam sempre no fim
+    """
+    if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+        codes, _ = pd.factorize(values, sort=True)
+        key = np.where(codes < 0, np.nan, codes).astype('float64')
+    else:
+        key = np.asarray(values, dtype='float64')
+    if not ascending:
+        key = -key
+    return np.where(np.isnan(key), np.inf, key)
+
+def top_k_positions(df, by, k, ascending=False, ties=None):
+    """
+    Retorna as posições das k primeiras linhas de df ordenadas por by, em ordem.
+    Usa np.argpartition (O(n)) e só ordena os candidatos. Empates são resolvidos
+    pelas colunas de ties (na mesma direção de by) e depois pela posição da linha
+    """
+    n_rows = len(df)
+    k = max(0, min(int(k), n_rows))
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    key = _sort_key(df[by], ascending)
+    if k < n_rows:
+        # Valor da k-ésima linha: entram todas as linhas melhores e todas as empatadas
+        # com ele, para que o desempate não dependa da ordem do argpartition
+        kth = key[np.argpartition(key, k - 1)[k - 1]]
+        candidates = np.flatnonzero(key <= kth)
+    else:
+        candidates = np.arange(n_rows)
+    sort_keys = [candidates]
+    for col in reversed(ties or []):
+        sort_keys.append(_sort_key(df[col].iloc[candidates], ascending))
+    sort_keys.append(key[candidates])
+    # np.lexsort ordena pela última chave e desempata pelas anteriores
+    order = np.lexsort(sort_keys)
+    return candidates[order[:k]]
+
+def top_k(df, by, k, ascending=False, ties=None, distinct=None):
+    """
+    Retorna as k primeiras linhas de df ordenadas por by (com o índice reiniciado),
+    sem ordenar o dataframe inteiro. Com distinct, mantém só a primeira linha de
+    cada valor dessa coluna (por exemplo, uma linha por restaurant_id)
+    """
+    if distinct is None:
+        return df.take(top_k_positions(df, by, k, ascending, ties)).reset_index(drop=True)
+    # Busca mais candidatos até encontrar k valores distintos (ou acabarem as linhas)
+    n_candidates = k
+    while True:
+        positions = top_k_positions(df, by, n_candidates, ascending, ties)
+        df_aux = df.take(positions).drop_duplicates(subset=distinct)
+        if len(df_aux) >= k or len(positions) >= len(df):
+            return df_aux.iloc[:k].reset_index(drop=True)
+        n_candidates *= 2
+
+def top_k_per_group(df, group, by, k, ascending=False, ties=None):
+    """
+    Retorna as k primeiras linhas de cada grupo de df, ordenadas por grupo e por by,
+    sem laço por grupo. Um único np.argpartition sobre a chave de by deslocada pelo
+    grupo separa k linhas de cada grupo; o maior valor delas é o limite do grupo, e
+    só as linhas até esse limite (com as empatadas) são ordenadas, também pelas
+    colunas de ties e pela posição
+    """
+    k = max(int(k), 0)
+    codes, _ = pd.factorize(df[group], sort=True)
+    key = _sort_key(df[by], ascending)
+    # Linhas sem grupo (código -1) ficam de fora
+    rows = np.flatnonzero(codes >= 0)
+    if k == 0 or len(rows) == 0:
+        return df.iloc[:0].reset_index(drop=True)
+    # Chave deslocada: as linhas de cada grupo ocupam um intervalo próprio, na ordem
+    # de by. Os infinitos (nulos) ficam logo depois dos valores finitos
+    values = key[rows]
+    finite = values[np.isfinite(values)]
+    low, high = (finite.min(), finite.max()) if len(finite) else (0.0, 0.0)
+    offset_key = codes[rows] * (high - low + 3) + (np.clip(values, low - 1, high + 1) - low + 1)
+    sizes = np.bincount(codes[rows])
+    ends = np.cumsum(sizes)
+    starts = ends - sizes
+    present = sizes > 0
+    kth = np.unique(np.concatenate([np.minimum(starts + k, ends)[present] - 1, ends[present] - 1]))
+    part = values[np.argpartition(offset_key, kth)]
+    # Limite de cada grupo: o maior valor entre as suas k primeiras linhas
+    bounds = np.stack([starts, np.minimum(starts + k, ends)], axis=1)[present].ravel()
+    limit = np.full(len(sizes), -np.inf)
+    limit[present] = np.maximum.reduceat(np.append(part, -np.inf), bounds)[::2]
+    candidates = rows[values <= limit[codes[rows]]]
+    sort_keys = [candidates]
+    for col in reversed(ties or []):
+        sort_keys.append(_sort_key(df[col].iloc[candidates], ascending))
+    sort_keys.append(key[candidates])
+    sort_keys.append(codes[candidates])
+    order = candidates[np.lexsort(sort_keys)]
+    # Posição de cada candidato dentro do seu grupo
+    sorted_codes = codes[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_codes, sorted_codes)
+    return df.take(order[rank < k]).reset_index(drop=True)
+# ====================================================================================
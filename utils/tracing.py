@@ -0,0 +1,180 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# ====================================================================================
+# Medição das seções das páginas (load, clean, aggregate, render)
+# ====================================================================================
+# A medição é ligada com a variável de ambiente ZOMATO_TRACE=1 ou com ?debug=1 na
+# URL. Com ZOMATO_TRACE_FILE=caminho.jsonl, cada execução de página é gravada como
+# uma linha JSON. Desligada, span() só consulta uma variável da thread. O streamlit
+# só é importado quando necessário, para que utils.data continue leve fora do app.
+TRACE_ENV = 'ZOMATO_TRACE'
+TRACE_FILE_ENV = 'ZOMATO_TRACE_FILE'
+
+# Execuções guardadas por sessão para o resumo do painel
+HISTORY_SIZE = 50
+
+_NULL_SPAN = contextlib.nullcontext()
+# O Streamlit executa o script de cada sessão em uma thread própria
+_LOCAL = threading.local()
+_FILE_LOCK = threading.Lock()
+
+def memory_mb():
+    """Memória residente do processo em MB (0 se não for possível medir)"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        # Fora do Linux só há o pico de memória (em bytes no macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+    except ImportError:
+        return 0.0
+
+class Trace:
+    """Seções medidas em uma execução de uma página"""
+    def __init__(self, page, session):
+        self.page = page
+        self.session = session
+        self.started = time.time()
+        self.spans = []
+        self._stack = []
+        self._start = time.perf_counter()
+        self._memory = memory_mb()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        record = {'name': name, 'depth': len(self._stack), 'ms': 0.0, 'memory_mb': 0.0}
+        self.spans.append(record)
+        self._stack.append(record)
+        memory = memory_mb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['ms'] = round((time.perf_counter() - start) * 1000, 3)
+            record['memory_mb'] = round(memory_mb() - memory, 3)
+            self._stack.pop()
+
+    def to_dict(self):
+        return {
+            'page': self.page,
+            'session': self.session,
+            'started': self.started,
+            'ms': round((time.perf_counter() - self._start) * 1000, 3),
+            'memory_mb': round(memory_mb() - self._memory, 3),
+            'spans': self.spans,
+        }
+
+def tracing_enabled():
+    """A medição está ligada por variável de ambiente ou pelo parâmetro ?debug=1"""
+    if os.environ.get(TRACE_ENV, '') not in ('', '0'):
+        return True
+    try:
+        import streamlit as st
+        return st.query_params.get('debug') == '1'
+    except Exception:
+        return False
+
+def _session_id():
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'bare'
+
+def start_trace(page):
+    """Começa a medição de uma execução da página (no início do script)"""
+    _LOCAL.trace = Trace(page, _session_id()) if tracing_enabled() else None
+    return _LOCAL.trace
+
+def span(name):
+    """
+    Mede o bloco como uma seção da execução atual, por exemplo
+    with span('aggregate.top_4'): ... Sem medição ligada, não faz nada
+    """
+    trace = getattr(_LOCAL, 'trace', None)
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name)
+
+def traced(name):
+    """Decorador que mede cada chamada da função como a seção name"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_fragment(page, name):
+    """
+    Decorador que transforma a função em um st.fragment medido como a seção name.
+    Quando um widget do fragmento muda, só o fragmento é reexecutado: essa
+    execução é medida à parte, como a página f'{page}/{name}'
+    """
+    def decorator(func):
+        import streamlit as st
+
+        @st.fragment
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if getattr(_LOCAL, 'trace', None) is not None:
+                with span(name):
+                    return func(*args, **kwargs)
+            # Reexecução só do fragmento: a medição da página já terminou
+            start_trace(f'{page}/{name}')
+            try:
+                with span(name):
+                    return func(*args, **kwargs)
+            finally:
+                # O fragmento não pode escrever na barra lateral
+                finish_trace(panel=False)
+        return wrapper
+    return decorator
+
+def finish_trace(panel=True):
+    """
+    Encerra a medição da execução (no fim do script): guarda a execução no
+    histórico da sessão, grava a linha JSON e mostra o painel na barra lateral
+    """
+    trace = getattr(_LOCAL, 'trace', None)
+    _LOCAL.trace = None
+    if trace is None:
+        return None
+    import streamlit as st
+    result = trace.to_dict()
+    history = st.session_state.setdefault('_trace_history', [])
+    history.append(result)
+    del history[:-HISTORY_SIZE]
+    path = os.environ.get(TRACE_FILE_ENV)
+    if path:
+        with _FILE_LOCK, open(path, 'a') as file:
+            file.write(json.dumps(result) + '\n')
+    if panel:
+        trace_panel(result, history)
+    return result
+
+def trace_panel(result, history):
+    """Painel de depuração com os tempos da execução atual e o resumo da sessão"""
+    import pandas as pd
+    import streamlit as st
+    with st.sidebar.expander('Tempos de execução', expanded=False):
+        st.markdown(f"**Execução atual:** {result['ms']:.0f} ms, {result['memory_mb']:+.1f} MB")
+        spans = pd.DataFrame(result['spans'], columns=['name', 'depth', 'ms', 'memory_mb'])
+        spans['name'] = [' ' * depth + name for name, depth in zip(spans['name'], spans['depth'])]
+        st.dataframe(spans.drop(columns='depth'), hide_index=True, use_container_width=True)
+
+        same_page = [run for run in history if run['page'] == result['page']]
+        st.markdown(f"**Sessão:** {len(same_page)} execuções desta página")
+        runs = pd.DataFrame([{'name': 'total', 'ms': run['ms']} for run in same_page]
+                            + [record for run in same_page for record in run['spans']],
+                            columns=['name', 'ms'])
+        summary = runs.groupby('name', sort=False)['ms'].agg(['count', 'mean', 'max']).round(1).reset_index()
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+# ====================================================================================
@@ -0,0 +1,82 @@
+import os
+import shutil
+
+import pandas as pd
+
+from utils.cube import CUBE_COLUMNS, build_cube, update_cube
+from utils.data import (clean_data, delta_dir, delta_files, delta_snapshot, derived_path, ensure_snapshot,
+                        mmap_enabled, prune_mmap, read_raw, read_snapshot, snapshot_hash, source_files,
+                        source_hashes, write_delta_snapshot, write_mmap, write_table)
+from utils.metrics import METRIC_COLUMNS, build_metrics, write_metrics
+from utils.paths import ZOMATO_PATH, CURRENCIES_PATH
+from utils.tracing import span
+
+# ====================================================================================
+# Atualização incremental (upsert) de restaurantes
+# ====================================================================================
+# Um arquivo de atualização tem o formato do zomato.csv e traz restaurantes novos
+# ou alterados. Cada restaurant_id do arquivo substitui todas as linhas com esse id
+# no df1. O arquivo é limpo e gravado como mais uma parte do snapshot
+# (write_delta_snapshot), sem regravar a base, e é guardado em delta_dir(), onde
+# entra no hash e na impressão digital do dataset. Ele só é publicado ali depois
+# que a parte, o cubo, as métricas e as colunas mapeadas da nova versão estão
+# gravados: as páginas em execução passam direto para a versão nova na próxima
+# execução, sem reconstruir nada, e um rebuild completo grava as mesmas partes.
+def upsert(delta_path, zomato_path=ZOMATO_PATH, currencies_path=CURRENCIES_PATH):
+    """
+    Aplica um arquivo de atualização sem reprocessar o csv: só o arquivo novo é
+    limpo e gravado como uma parte do snapshot, o cubo recebe a diferença das
+    medidas e as métricas e as colunas mapeadas são gravadas para a nova versão.
+    Retorna o número de linhas novas e de linhas removidas. Não execute duas
+    atualizações ao mesmo tempo no mesmo dataset
+    """
+    files = ensure_snapshot(zomato_path, currencies_path)
+    old_hash = snapshot_hash(files[-1])
+    directory = delta_dir(zomato_path)
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, f'{len(files):06d}.csv')
+    # Até o os.replace do final, a cópia não termina em .csv e não faz parte do dataset
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    shutil.copyfile(delta_path, tmp_path)
+    try:
+        content_hash = source_hashes(source_files(zomato_path), delta_files(zomato_path) + [tmp_path],
+                                     currencies_path)[-1]
+        with span('clean'):
+            delta = clean_data(read_raw(tmp_path), currencies_path)
+        with span('load.read_snapshot'):
+            # Só as linhas dos restaurantes substituídos
+            removed = read_snapshot(files, CUBE_COLUMNS, restaurant_ids=delta['restaurant_id'].unique())
+        cube_path = derived_path('cube', zomato_path)
+        if snapshot_hash(cube_path) == old_hash:
+            cube = pd.read_parquet(cube_path)
+        else:
+            with span('aggregate.cube'):
+                cube = build_cube(read_snapshot(files, CUBE_COLUMNS))
+        with span('aggregate.upsert'):
+            cube = update_cube(cube, delta, removed)
+
+        # A nova versão: a parte do snapshot, o cubo, as métricas e as colunas mapeadas
+        files = files + [delta_snapshot(target)]
+        write_delta_snapshot(delta, files[-1], files[:-1], content_hash)
+        write_table(cube, cube_path, content_hash)
+        with span('aggregate.metrics'):
+            write_metrics(build_metrics(read_snapshot(files, METRIC_COLUMNS), cube), content_hash, zomato_path)
+        if mmap_enabled():
+            with span('load.write_mmap'):
+                # As colunas da versão atual continuam lá até a publicação
+                write_mmap(files, content_hash, zomato_path, prune=False)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if mmap_enabled():
+        prune_mmap(content_hash, zomato_path)
+    return len(delta), len(removed)
+# ====================================================================================
+
+if __name__ == '__main__':
+    # python -m utils.upsert novos_restaurantes.csv
+    import sys
+    for delta_path in sys.argv[1:]:
+        added, removed = upsert(delta_path)
+        print(f'{delta_path}: {added} linhas novas, {removed} linhas substituídas')